@@ -0,0 +1,185 @@
+"""
+ActivityLog retention. Once a calendar month (UTC) is entirely older than
+ACTIVITY_LOG_RETENTION_DAYS, its rows are counted in the rollups, written
+to a gzipped NDJSON archive in the export format, then deleted from the
+live table in small batches, each a short transaction of its own.
+Archived months stay readable through iter_archived_rows().
+"""
+import gzip
+import hashlib
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Max
+from django.utils import timezone
+
+from .export import encode_rows, iter_rows
+from .models import ActivityLog, ActivityLogArchive, ActivityLogRollupWatermark
+from .rollups import update_rollups
+
+
+# Months
+def month_start(value):
+    return value.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+def archive_cutoff(days=None):
+    """
+    Start of the oldest month that must stay live: every row before it
+    is at least `days` old.
+    """
+    days = settings.ACTIVITY_LOG_RETENTION_DAYS if days is None else days
+    return month_start(timezone.now() - timedelta(days=days))
+
+def pending_months(cutoff):
+    #months before the cutoff that still have live rows, oldest first
+    first = (
+        ActivityLog.objects.filter(timestamp__lt=cutoff)
+        .order_by('timestamp')
+        .values_list('timestamp', flat=True)
+        .first()
+    )
+    months = []
+    start = month_start(first) if first else cutoff
+    while start < cutoff:
+        months.append(start)
+        start = next_month(start)
+    return months
+
+def month_rows(start):
+    return ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=next_month(start))
+
+
+# Archiving
+def delete_rows(queryset, batch_size=None, pause=0):
+    """
+    Delete `queryset` by primary key, `batch_size` rows per statement,
+    so no transaction holds many row locks or a long undo log.
+    """
+    batch_size = batch_size or settings.ACTIVITY_LOG_DELETE_BATCH_SIZE
+    ids_query = queryset.order_by().values_list('id', flat=True)
+    deleted = 0
+    while True:
+        ids = list(ids_query[:batch_size])
+        if not ids:
+            return deleted
+        deleted += ActivityLog.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            #room for replicas and concurrent writers
+            time.sleep(pause)
+
+def write_archive(start, rows, last_id):
+    """
+    Store `rows` as a new part of the month's archive.
+    Returns None when there is nothing to archive.
+    """
+    count = 0
+    digest = hashlib.sha256()
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with tempfile.TemporaryFile() as tmp:
+        for block in encode_rows(counted(iter_rows(rows)), 'ndjson', compress=True):
+            digest.update(block)
+            tmp.write(block)
+        if not count:
+            return None
+
+        archive = ActivityLogArchive(
+            month=start.date(),
+            row_count=count,
+            file_size=tmp.tell(),
+            sha256=digest.hexdigest(),
+            last_id=last_id,
+        )
+        tmp.seek(0)
+        archive.file.save(f"{start:%Y-%m}.ndjson.gz", File(tmp), save=False)
+
+    try:
+        archive.save()
+    except Exception:
+        archive.file.delete(save=False)
+        raise
+    return archive
+
+def archive_month(start, upto_id, batch_size=None, pause=0):
+    """
+    Archive the month starting at `start`, rows with an id up to `upto_id`
+    (newer rows are left for the next run), then delete them.
+    Returns (new archive or None, rows deleted).
+    """
+    rows = month_rows(start).filter(id__lte=upto_id)
+    deleted = 0
+
+    #rows an interrupted run archived but did not get to delete
+    archived_upto = (
+        ActivityLogArchive.objects.filter(month=start.date())
+        .aggregate(Max('last_id'))['last_id__max']
+    )
+    if archived_upto is not None:
+        deleted += delete_rows(rows.filter(id__lte=archived_upto), batch_size, pause)
+        rows = rows.filter(id__gt=archived_upto)
+
+    archive = write_archive(start, rows, upto_id)
+    if archive is not None:
+        deleted += delete_rows(rows, batch_size, pause)
+    return archive, deleted
+
+def archive_logs(days=None, batch_size=None, pause=0):
+    """
+    Archive every month that is past retention.
+    Returns [(month start, new archive or None, rows deleted)].
+    """
+    cutoff = archive_cutoff(days)
+    #only rows already counted in the rollups are removed; ids are
+    #increasing, rows inserted from here on are not touched
+    update_rollups()
+    upto_id = ActivityLogRollupWatermark.current()
+    results = []
+    for start in pending_months(cutoff):
+        results.append((start, *archive_month(start, upto_id, batch_size, pause)))
+    return results
+
+
+# Reading
+ROW_FILTERS = {
+    'action': 'action',
+    'status': 'status',
+    'user': 'user_id',
+    'ip': 'ip_address',
+}
+
+def row_matches(row, filters):
+    #`filters` are ActivityLogFilterSerializer.validated_data
+    for param, field in ROW_FILTERS.items():
+        if param in filters and row[field] != filters[param]:
+            return False
+    if 'since' in filters and row['timestamp'] < filters['since']:
+        return False
+    if 'until' in filters and row['timestamp'] >= filters['until']:
+        return False
+    return True
+
+def iter_archived_rows(archives, filters=None):
+    """
+    Yield the rows stored in `archives` that match `filters`, decompressed
+    line by line, as export rows (see export.iter_rows).
+    """
+    for archive in archives:
+        with archive.file.storage.open(archive.file.name, 'rb') as f:
+            with gzip.open(f, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    row = json.loads(line)
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                    if row_matches(row, filters or {}):
+                        yield row
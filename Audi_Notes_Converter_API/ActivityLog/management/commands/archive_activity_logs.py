@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from ActivityLog.archive import archive_cutoff, archive_logs, month_rows, pending_months
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive activity logs of every month past retention to gzipped "
+        "NDJSON files, then delete them from the table in small batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ACTIVITY_LOG_RETENTION_DAYS,
+            help='Keep months with rows newer than this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.ACTIVITY_LOG_DELETE_BATCH_SIZE,
+            help='Rows deleted per statement',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between delete batches',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the months that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for start in pending_months(archive_cutoff(options['days'])):
+                count = month_rows(start).aggregate(count=Count('id'))['count']
+                self.stdout.write(f"{start:%Y-%m}: {count} row(s)")
+            return
+
+        results = archive_logs(options['days'], options['batch_size'], options['pause'])
+        for start, archive, deleted in results:
+            archived = archive.row_count if archive else 0
+            self.stdout.write(f"{start:%Y-%m}: archived {archived}, deleted {deleted} row(s)")
+        self.stdout.write(f"Archived {len(results)} month(s)")
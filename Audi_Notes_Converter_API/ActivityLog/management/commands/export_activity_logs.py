@@ -0,0 +1,63 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ActivityLog.export import OUTPUTS, encode_rows, iter_rows
+from ActivityLog.models import ActivityLog
+from ActivityLog.serializers import ActivityLogFilterSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream activity logs, oldest first, as NDJSON or CSV to a file or "
+        "stdout. Memory use does not depend on the number of rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(OUTPUTS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='Compress the export with gzip')
+        parser.add_argument('--file', default='-', help="Destination path, '-' for stdout")
+        parser.add_argument('--chunk-size', type=int, help='Rows read per query')
+        parser.add_argument('--since', help='ISO 8601 timestamp, inclusive')
+        parser.add_argument('--until', help='ISO 8601 timestamp, exclusive')
+        parser.add_argument('--action')
+        parser.add_argument('--status', choices=[value for value, _ in ActivityLog.STATUS_CHOICES])
+        parser.add_argument('--user', type=int, help='User id')
+        parser.add_argument('--ip')
+
+    def handle(self, *args, **options):
+        #the same filters as the export endpoint
+        params = ActivityLogFilterSerializer(data={
+            name: options[name]
+            for name in ('since', 'until', 'action', 'status', 'user', 'ip')
+            if options[name] is not None
+        })
+        if not params.is_valid():
+            raise CommandError(params.errors)
+
+        logs = params.filter(ActivityLog.objects.all())
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        blocks = encode_rows(
+            counted(iter_rows(logs, options['chunk_size'])),
+            options['output'],
+            options['gzip'],
+        )
+        destination = sys.stdout.buffer if options['file'] == '-' else open(options['file'], 'wb')
+        try:
+            for block in blocks:
+                destination.write(block)
+        finally:
+            if destination is not sys.stdout.buffer:
+                destination.close()
+            else:
+                destination.flush()
+
+        #stdout may be the export itself
+        self.stderr.write(f"Exported {exported} activity log(s)")
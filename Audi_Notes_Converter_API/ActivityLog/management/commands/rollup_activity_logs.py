@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ActivityLog.models import ActivityLogRollupWatermark
+from ActivityLog.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Add activity logs written since the last run to the hourly rollups. "
+        "Safe to interrupt, the next run resumes from the watermark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.ACTIVITY_LOG_ROLLUP['BATCH_SIZE'],
+            help='Log ids counted per transaction',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, catching up every this many seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            counted = update_rollups(options['batch_size'])
+            self.stdout.write(
+                f"Counted {counted} log(s), rolled up to id {ActivityLogRollupWatermark.current()}"
+            )
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
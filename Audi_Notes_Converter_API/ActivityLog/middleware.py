@@ -36,5 +36,5 @@ class GlobalExceptionLoggingMiddleware:
             details=details,
             request=request,
             status="failed",
-            log_file="errors",
+            category="errors",
         )
\ No newline at end of file
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-02-24 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ActivityLog', '0002_alter_activitylog_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='ActivityLog_timesta_f937d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'timestamp'], name='ActivityLog_user_id_0ec98e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['action', 'timestamp'], name='ActivityLog_action_9da12b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['status', 'timestamp'], name='ActivityLog_status_596a93_idx'),
+        ),
+    ]
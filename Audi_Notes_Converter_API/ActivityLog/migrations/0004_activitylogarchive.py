@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-02-26 10:41
+
+import ActivityLog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ActivityLog', '0003_activitylog_activitylog_timesta_f937d9_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the archived month')),
+                ('file', models.FileField(upload_to=ActivityLog.models.activity_log_archive_path)),
+                ('row_count', models.PositiveIntegerField()),
+                ('file_size', models.BigIntegerField(help_text='File size in bytes')),
+                ('sha256', models.CharField(help_text='sha256 of the archive file', max_length=64)),
+                ('last_id', models.BigIntegerField(help_text='Rows of the month up to this id are archived in this or an earlier part')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['month', 'last_id'],
+            },
+        ),
+    ]
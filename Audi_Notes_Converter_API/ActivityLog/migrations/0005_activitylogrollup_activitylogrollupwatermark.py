@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-02-27 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ActivityLog', '0004_activitylogarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour')),
+                ('action', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed')], max_length=10)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['hour'],
+                'indexes': [models.Index(fields=['action', 'hour'], name='ActivityLog_action_2018b0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'action', 'status'), name='unique_rollup_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivityLogRollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
 class ActivityLog(models.Model):
@@ -32,13 +33,89 @@ class ActivityLog(models.Model):
 
     status = models.CharField(max_length=10,choices=STATUS_CHOICES)
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # set when the event happens, entries may be saved later in a batch
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        #newest-first keyset pages on (timestamp, id), unfiltered or per filter;
+        #InnoDB appends the primary key to every secondary index
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['action', 'timestamp']),
+            models.Index(fields=['status', 'timestamp']),
+        ]
         verbose_name = 'Activity Log'
         verbose_name_plural = 'Activity Logs'
 
     def __str__(self):
         user_display = self.user.email if self.user else 'Anonymous'
         return f"{self.timestamp} | {user_display} | {self.action} | {self.status}"
+
+
+def activity_log_archive_path(instance, filename):
+    return f"activity_logs/archive/{instance.month:%Y}/{filename}"
+
+class ActivityLogArchive(models.Model):
+    """
+    Gzipped NDJSON of archived logs of one month (UTC), in the export
+    format. A month gets another part if rows reach it after it was
+    archived.
+    """
+    month = models.DateField(help_text='First day of the archived month')
+    file = models.FileField(upload_to=activity_log_archive_path)
+    row_count = models.PositiveIntegerField()
+    file_size = models.BigIntegerField(help_text='File size in bytes')
+    sha256 = models.CharField(max_length=64,help_text='sha256 of the archive file')
+    last_id = models.BigIntegerField(help_text='Rows of the month up to this id are archived in this or an earlier part')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['month', 'last_id']
+
+    def __str__(self):
+        return f"Activity log archive {self.month:%Y-%m} ({self.row_count} rows)"
+
+
+class ActivityLogRollup(models.Model):
+    """
+    Number of logs per hour (UTC), action and status, kept up to date by
+    ActivityLog.rollups.update_rollups() so dashboards never scan the logs.
+    """
+    hour = models.DateTimeField(help_text='Start of the hour')
+    action = models.CharField(max_length=ActivityLog.ACTION_MAX)
+    status = models.CharField(max_length=10,choices=ActivityLog.STATUS_CHOICES)
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['hour']
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'action', 'status'], name='unique_rollup_bucket'),
+        ]
+        #the unique index serves time ranges across actions, this one a single action
+        indexes = [
+            models.Index(fields=['action', 'hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}:00 | {self.action} | {self.status} | {self.count}"
+
+class ActivityLogRollupWatermark(models.Model):
+    #single row: logs with an id up to last_id are counted in the rollups
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Activity logs rolled up to id {self.last_id}"
+
+    @classmethod
+    def lock(cls):
+        #call inside a transaction, rollup runs queue on this row
+        watermark, _ = cls.objects.select_for_update().get_or_create(pk=1)
+        return watermark
+
+    @classmethod
+    def current(cls):
+        watermark = cls.objects.filter(pk=1).first()
+        return watermark.last_id if watermark else 0
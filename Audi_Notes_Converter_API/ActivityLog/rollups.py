@@ -0,0 +1,85 @@
+"""
+Hourly ActivityLog counts per action and status. update_rollups() adds
+the logs written since the watermark (a log id) to ActivityLogRollup,
+one id range per transaction, so a run can stop anywhere and the next
+one resumes without counting a log twice.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ActivityLog, ActivityLogRollup, ActivityLogRollupWatermark
+
+
+def settled_id(lag=None):
+    """
+    Highest id that is safe to count. Ids are handed out before commit,
+    so the newest ids may still have lower ones in flight; logs older
+    than `lag` seconds are assumed committed.
+    """
+    lag = settings.ACTIVITY_LOG_ROLLUP['LAG'] if lag is None else lag
+    return (
+        ActivityLog.objects.filter(timestamp__lte=timezone.now() - timedelta(seconds=lag))
+        .order_by('-timestamp')
+        .values_list('id', flat=True)
+        .first()
+    ) or 0
+
+def add_counts(after_id, upto_id):
+    """
+    Add the logs with an id in (after_id, upto_id] to the rollups.
+    Returns the number of logs counted.
+    """
+    buckets = (
+        ActivityLog.objects.filter(id__gt=after_id, id__lte=upto_id)
+        .order_by()
+        .annotate(hour=TruncHour('timestamp'))
+        .values('hour', 'action', 'status')
+        .annotate(count=Count('id'))
+    )
+    counts = {(b['hour'], b['action'], b['status']): b['count'] for b in buckets}
+    if not counts:
+        return 0
+    total = sum(counts.values())
+
+    existing = ActivityLogRollup.objects.filter(
+        hour__in={hour for hour, _, _ in counts},
+        action__in={action for _, action, _ in counts},
+    )
+    changed = []
+    for rollup in existing:
+        key = (rollup.hour, rollup.action, rollup.status)
+        if key in counts:
+            rollup.count += counts.pop(key)
+            changed.append(rollup)
+
+    ActivityLogRollup.objects.bulk_update(changed, ['count'])
+    ActivityLogRollup.objects.bulk_create([
+        ActivityLogRollup(hour=hour, action=action, status=status, count=count)
+        for (hour, action, status), count in counts.items()
+    ])
+    return total
+
+def update_rollups(batch_size=None, lag=None):
+    """
+    Count every settled log past the watermark. Returns the number of
+    logs counted.
+    """
+    batch_size = batch_size or settings.ACTIVITY_LOG_ROLLUP['BATCH_SIZE']
+    bound = settled_id(lag)
+    counted = 0
+
+    while True:
+        with transaction.atomic():
+            #holding the watermark lock keeps concurrent runs from double counting
+            watermark = ActivityLogRollupWatermark.lock()
+            if watermark.last_id >= bound:
+                return counted
+            upto_id = min(watermark.last_id + batch_size, bound)
+            counted += add_counts(watermark.last_id, upto_id)
+            watermark.last_id = upto_id
+            watermark.save(update_fields=['last_id', 'updated_at'])
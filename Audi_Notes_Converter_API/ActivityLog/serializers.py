@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ActivityLog
+from .models import ActivityLog, ActivityLogArchive
 
 class ActivityLogSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(source='user.id',read_only=True)
@@ -9,4 +9,52 @@ class ActivityLogSerializer(serializers.ModelSerializer):
         model = ActivityLog
 
         fields = ['id','user_id','username','action','details','ip_address','status','timestamp',]
-        read_only_fields = fields
\ No newline at end of file
+        read_only_fields = fields
+
+class ActivityLogFilterSerializer(serializers.Serializer):
+    # Query parameters of the activity log list
+    action = serializers.CharField(required=False, max_length=ActivityLog.ACTION_MAX)
+    status = serializers.ChoiceField(required=False, choices=ActivityLog.STATUS_CHOICES)
+    user = serializers.IntegerField(required=False, min_value=1)
+    ip = serializers.IPAddressField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('since') and attrs.get('until') and attrs['since'] > attrs['until']:
+            raise serializers.ValidationError("'since' must be before 'until'")
+        return attrs
+
+    def filter(self, queryset):
+        filters = {
+            'action': 'action',
+            'status': 'status',
+            'user': 'user_id',
+            'ip': 'ip_address',
+            'since': 'timestamp__gte',
+            'until': 'timestamp__lt',
+        }
+        for param, lookup in filters.items():
+            if param in self.validated_data:
+                queryset = queryset.filter(**{lookup: self.validated_data[param]})
+        return queryset
+
+class ActivityLogArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityLogArchive
+        fields = ['id','month','row_count','file_size','sha256','created_at',]
+        read_only_fields = fields
+
+class ActivityLogStatsSerializer(serializers.Serializer):
+    # Query parameters of the rollup time series
+    action = serializers.CharField(required=False, max_length=ActivityLog.ACTION_MAX)
+    status = serializers.ChoiceField(required=False, choices=ActivityLog.STATUS_CHOICES)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    interval = serializers.ChoiceField(choices=['hour', 'day'], default='hour')
+    group_by = serializers.ChoiceField(required=False, choices=['action', 'status'])
+
+    def validate(self, attrs):
+        if attrs.get('since') and attrs.get('until') and attrs['since'] > attrs['until']:
+            raise serializers.ValidationError("'since' must be before 'until'")
+        return attrs
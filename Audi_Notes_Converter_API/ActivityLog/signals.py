@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from Document.models import PendingFileDeletion
+from .models import ActivityLogArchive
+
+
+@receiver(post_delete, sender=ActivityLogArchive)
+def delete_archive_file(sender, instance, **kwargs):
+    PendingFileDeletion.schedule(instance.file.name)
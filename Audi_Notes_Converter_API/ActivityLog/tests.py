@@ -1,3 +1,280 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import writer
+from .archive import archive_logs, iter_archived_rows, month_start, next_month
+from .export import FIELDS, encode_rows, iter_rows
+from .models import ActivityLog, ActivityLogArchive, ActivityLogRollup, ActivityLogRollupWatermark
+from .rollups import update_rollups
+from .writer import ActivityLogWriter
 
 # Create your tests here.
+#logs of the views under test are written in the test's transaction
+SYNC_ACTIVITY_LOG = override_settings(ACTIVITY_LOG_WRITER={**settings.ACTIVITY_LOG_WRITER, 'ENABLED': False})
+#start of a month well past any retention used below
+START = month_start(timezone.now() - timedelta(days=200))
+
+
+def entry(action="TEST"):
+    return ActivityLog(action=action, status="success")
+
+def create_logs(count, start=START, step=timedelta(minutes=20), **fields):
+    #`count` logs `step` apart, alternating LOGIN/UPLOAD and success/failed
+    return ActivityLog.objects.bulk_create([
+        ActivityLog(
+            action="LOGIN" if i % 2 == 0 else "UPLOAD",
+            status="success" if i % 3 else "failed",
+            timestamp=start + i * step,
+            **fields,
+        )
+        for i in range(count)
+    ])
+
+
+class ActivityLogWriterTests(TransactionTestCase):
+    def test_entries_are_written_in_batches_by_the_thread(self):
+        log_writer = ActivityLogWriter(batch_size=3, flush_interval=60)
+
+        with mock.patch.object(writer, "persist", wraps=writer.persist) as persist:
+            for i in range(7):
+                log_writer.write(entry(f"TEST_{i}"), "errors")
+            log_writer.close()
+
+        self.assertEqual([len(c.args[0]) for c in persist.call_args_list], [3, 3, 1])
+        self.assertEqual(ActivityLog.objects.count(), 7)
+
+    def test_flush_waits_for_the_queued_entries(self):
+        log_writer = ActivityLogWriter(batch_size=100, flush_interval=0.05)
+        self.addCleanup(log_writer.close)
+
+        log_writer.write(entry(), "errors")
+
+        self.assertTrue(log_writer.flush(timeout=5))
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+
+class ActivityLogOverflowTests(TestCase):
+    def full_writer(self, overflow):
+        #no consumer thread, the queue stays full after one entry
+        log_writer = ActivityLogWriter(max_queue=1, overflow=overflow)
+        log_writer._ensure_thread = lambda: None
+        log_writer.write(entry(), "errors")
+        return log_writer
+
+    def test_sync_overflow_writes_in_the_caller(self):
+        self.full_writer(writer.OVERFLOW_SYNC).write(entry("OVERFLOW"), "errors")
+
+        self.assertTrue(ActivityLog.objects.filter(action="OVERFLOW").exists())
+
+    def test_drop_overflow_counts_the_lost_entry(self):
+        log_writer = self.full_writer(writer.OVERFLOW_DROP)
+
+        with self.assertLogs("errors", level="ERROR"):
+            log_writer.write(entry("OVERFLOW"), "errors")
+
+        self.assertEqual(log_writer.dropped, 1)
+        self.assertFalse(ActivityLog.objects.exists())
+
+
+@SYNC_ACTIVITY_LOG
+class ActivityLogListTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        create_logs(9)
+
+    def test_pages_cover_every_log_newest_first(self):
+        timestamps, url = [], reverse("activity-log-list") + "?page_size=4"
+        while url:
+            page = self.client.get(url).data
+            timestamps.extend(row["timestamp"] for row in page["results"])
+            url = page["next"]
+
+        self.assertEqual(len(timestamps), 9)
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_filters(self):
+        page = self.client.get(reverse("activity-log-list"), {
+            "action": "LOGIN",
+            "status": "failed",
+            "since": START.isoformat(),
+            "until": (START + timedelta(hours=3)).isoformat(),
+        }).data
+
+        self.assertEqual([row["action"] for row in page["results"]], ["LOGIN", "LOGIN"])
+        self.assertTrue(all(row["status"] == "failed" for row in page["results"]))
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse("activity-log-list"), {"status": "maybe"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_admins_only(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(username="reader"))
+
+        self.assertEqual(self.client.get(reverse("activity-log-list")).status_code, 403)
+
+
+class ExportTests(TestCase):
+    def test_keyset_batches_keep_rows_sharing_a_timestamp(self):
+        #a batch boundary falls inside the rows with the same timestamp
+        logs = create_logs(3) + create_logs(4, start=START + timedelta(hours=5), step=timedelta(0))
+
+        rows = list(iter_rows(ActivityLog.objects.all(), chunk_size=2))
+
+        self.assertEqual([row["id"] for row in rows], [log.id for log in logs])
+
+    def test_ndjson_and_gzip(self):
+        create_logs(3)
+
+        data = b"".join(encode_rows(iter_rows(ActivityLog.objects.all()), "ndjson", compress=True))
+        lines = gzip.decompress(data).decode().splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(list(json.loads(lines[0])), FIELDS)
+        self.assertEqual(json.loads(lines[0])["timestamp"], START.isoformat())
+
+    def test_csv_has_a_header_row(self):
+        create_logs(2)
+
+        data = b"".join(encode_rows(iter_rows(ActivityLog.objects.all()), "csv"))
+        rows = list(csv.reader(io.StringIO(data.decode())))
+
+        self.assertEqual(rows[0], FIELDS)
+        self.assertEqual(len(rows), 3)
+
+
+@SYNC_ACTIVITY_LOG
+class ExportViewTests(TestCase):
+    def test_filtered_logs_are_streamed_as_a_download(self):
+        create_logs(6)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username="admin", is_staff=True))
+
+        response = client.get(reverse("activity-log-export"), {"output": "csv", "action": "UPLOAD"})
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("attachment", response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(row[FIELDS.index("action")] == "UPLOAD" for row in rows[1:]))
+
+
+@SYNC_ACTIVITY_LOG
+class ArchiveTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        create_logs(5)
+        create_logs(2, start=next_month(START))
+        self.recent = ActivityLog.objects.create(action="LOGIN", status="success")
+
+    def test_old_months_are_archived_counted_and_deleted(self):
+        results = archive_logs(days=30, batch_size=2)
+
+        archived = [(start, archive.row_count, deleted) for start, archive, deleted in results[:2]]
+        self.assertEqual(archived, [(START, 5, 5), (next_month(START), 2, 2)])
+        self.assertEqual(list(ActivityLog.objects.all()), [self.recent])
+        self.assertEqual(sum(ActivityLogRollup.objects.values_list("count", flat=True)), 7)
+
+    def test_archived_rows_read_back_with_filters(self):
+        archive_logs(days=30)
+        archives = ActivityLogArchive.objects.filter(month=START.date())
+
+        rows = list(iter_archived_rows(archives))
+        logins = list(iter_archived_rows(archives, {"action": "LOGIN"}))
+
+        self.assertEqual([row["timestamp"] for row in rows], [START + i * timedelta(minutes=20) for i in range(5)])
+        self.assertEqual(len(logins), 3)
+
+    def test_a_second_run_archives_nothing(self):
+        archive_logs(days=30)
+
+        self.assertTrue(all(archive is None for _, archive, _ in archive_logs(days=30)))
+        self.assertEqual(ActivityLogArchive.objects.count(), 2)
+
+    def test_archive_view_streams_a_month(self):
+        archive_logs(days=30)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username="admin", is_staff=True))
+
+        response = client.get(reverse("activity-log-archive", args=[START.year, START.month]))
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+
+@SYNC_ACTIVITY_LOG
+class RollupTests(TestCase):
+    def counts(self):
+        return {
+            (rollup.hour, rollup.action, rollup.status): rollup.count
+            for rollup in ActivityLogRollup.objects.all()
+        }
+
+    def test_logs_are_counted_per_hour_action_and_status(self):
+        create_logs(6)
+
+        self.assertEqual(update_rollups(lag=0), 6)
+
+        hour = timedelta(hours=1)
+        self.assertEqual(self.counts(), {
+            (START, "LOGIN", "failed"): 1,
+            (START, "LOGIN", "success"): 1,
+            (START, "UPLOAD", "success"): 1,
+            (START + hour, "UPLOAD", "failed"): 1,
+            (START + hour, "LOGIN", "success"): 1,
+            (START + hour, "UPLOAD", "success"): 1,
+        })
+
+    def test_runs_are_incremental_in_small_batches(self):
+        create_logs(3)
+        update_rollups(batch_size=2, lag=0)
+        create_logs(3)
+
+        self.assertEqual(update_rollups(batch_size=2, lag=0), 3)
+        self.assertEqual(self.counts()[(START, "LOGIN", "success")], 2)
+        self.assertEqual(sum(self.counts().values()), 6)
+        self.assertEqual(ActivityLogRollupWatermark.current(), ActivityLog.objects.latest("id").id)
+
+    def test_logs_younger_than_the_lag_wait_for_the_next_run(self):
+        create_logs(2)
+        ActivityLog.objects.create(action="LOGIN", status="success")
+
+        self.assertEqual(update_rollups(lag=3600), 2)
+
+    def test_stats_view_sums_the_rollups(self):
+        create_logs(6)
+        update_rollups(lag=0)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username="admin", is_staff=True))
+
+        response = client.get(reverse("activity-log-stats"), {
+            "since": START.isoformat(),
+            "until": (START + timedelta(days=1)).isoformat(),
+            "group_by": "status",
+        })
+
+        self.assertEqual(
+            [(row["status"], row["count"]) for row in response.data["results"]],
+            [("failed", 1), ("success", 2), ("failed", 1), ("success", 2)],
+        )
@@ -1,6 +1,10 @@
 from django.urls import path
 from .views import (
+    ActivityLogArchiveListView,
+    ActivityLogArchiveView,
+    ActivityLogExportView,
     ActivityLogListView,
+    ActivityLogStatsView,
     UserActivityLogView,
 )
 
@@ -8,6 +12,16 @@ urlpatterns = [
     # List all activity logs (admin only)
     path('', ActivityLogListView.as_view(), name='activity-log-list'),
 
+    # Stream matching activity logs as NDJSON or CSV (admin only)
+    path('export/', ActivityLogExportView.as_view(), name='activity-log-export'),
+
+    # Hourly or daily log counts from the rollups (admin only)
+    path('stats/', ActivityLogStatsView.as_view(), name='activity-log-stats'),
+
+    # Archived months, and the logs of one month (admin only)
+    path('archives/', ActivityLogArchiveListView.as_view(), name='activity-log-archive-list'),
+    path('archives/<int:year>/<int:month>/', ActivityLogArchiveView.as_view(), name='activity-log-archive'),
+
     # List activity logs for a specific user (admin only)
     path('user/<int:user_id>/', UserActivityLogView.as_view(), name='user-activity-log'),
 ]
\ No newline at end of file
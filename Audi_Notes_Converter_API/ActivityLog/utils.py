@@ -1,8 +1,10 @@
 import json
 import logging
+from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from .models import ActivityLog
+from .writer import get_writer, persist
 
 User = get_user_model()
 
@@ -49,9 +51,8 @@ def log_activity(
             details_str = json.dumps(details, ensure_ascii=False)
         else:
             details_str = str(details) if details else ""
-        # Save to database
-        ActivityLog.objects.create(
-            user=user,
+        entry = ActivityLog(
+            user_id=user.id if user else None,
             action=action,
             details=details_str,
             ip_address=ip_address,
@@ -59,17 +60,12 @@ def log_activity(
             timestamp=timezone.now(),
         )
 
-        # Write to file logger
-        logger = LOGGERS.get(category, LOGGERS["errors"])
-
-        logger.info(
-            "[%s] user=%s ip=%s action=%s details=%s",
-            status.upper(),
-            user.id if user else "anonymous",
-            ip_address,
-            action,
-            details_str,
-        )
+        # Saved and written to the file logger in the background,
+        # or right away when the buffered writer is disabled
+        if settings.ACTIVITY_LOG_WRITER["ENABLED"]:
+            get_writer().write(entry, category)
+        else:
+            persist([(entry, category)])
     except Exception as e:
         logging.getLogger("errors").error(
             "Logging failure: %s", str(e), exc_info=True
@@ -1,26 +1,192 @@
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework import status
 
-from .models import ActivityLog
-from .serializers import ActivityLogSerializer
+from .archive import iter_archived_rows
+from .export import GZIP_CONTENT_TYPE, OUTPUTS, encode_rows, export_filename, iter_rows
+from .models import (
+    ActivityLog,
+    ActivityLogArchive,
+    ActivityLogRollup,
+    ActivityLogRollupWatermark,
+)
+from .serializers import (
+    ActivityLogArchiveSerializer,
+    ActivityLogFilterSerializer,
+    ActivityLogSerializer,
+    ActivityLogStatsSerializer,
+)
+from .utils import log_activity
+from Audi_Notes_Converter_API.pagination import KeysetPagination
 
 # Create your views here.
-class ActivityLogListView(APIView):
+class ActivityLogQueryMixin:
+    """
+    Filters from the query string (action, status, user, ip, since, until)
+    and newest-first keyset pages, user joined in the same query.
+    """
+    ordering = ('-timestamp', '-id')
+
+    def filter_params(self, request):
+        params = ActivityLogFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params
+
+    def filtered_queryset(self, request, **filters):
+        logs = ActivityLog.objects.select_related("user").filter(**filters)
+        return self.filter_params(request).filter(logs)
+
+    def paginated_response(self, request, logs):
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        serializer = ActivityLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def export_response(self, request, rows, stamp):
+        """
+        Stream export rows as ?output=ndjson (default) or csv, gzipped
+        with ?gzip=true.
+        """
+        #not ?format=, DRF reserves it for renderer selection
+        output = request.query_params.get("output", "ndjson")
+        if output not in OUTPUTS:
+            raise ValidationError(
+                {"output": f"Unknown output: {output}, expected one of {', '.join(OUTPUTS)}"}
+            )
+        compress = request.query_params.get("gzip", "").lower() in ("1", "true")
+
+        content_type = GZIP_CONTENT_TYPE if compress else OUTPUTS[output][0]
+        response = StreamingHttpResponse(
+            encode_rows(rows, output, compress),
+            content_type=content_type,
+        )
+        filename = export_filename(output, compress, stamp)
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+        return response
+
+
+class ActivityLogListView(ActivityLogQueryMixin, APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        logs = ActivityLog.objects.all().order_by("-timestamp")
-        serializer = ActivityLogSerializer(logs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        logs = self.filtered_queryset(request)
+        return self.paginated_response(request, logs)
 
 
-class UserActivityLogView(APIView):
+class UserActivityLogView(ActivityLogQueryMixin, APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request, user_id):
-        logs = ActivityLog.objects.filter(user_id=user_id).order_by("-timestamp")
-        serializer = ActivityLogSerializer(logs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        logs = self.filtered_queryset(request, user_id=user_id)
+        return self.paginated_response(request, logs)
+
+
+class ActivityLogExportView(ActivityLogQueryMixin, APIView):
+    """
+    Streams every matching log, oldest first. Takes the same filters as
+    the list, see export_response() for the output.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        logs = self.filtered_queryset(request)
+
+        log_activity(
+            request=request,
+            user=request.user,
+            action="LOG_EXPORT",
+            details=request.query_params.dict(),
+            status="success",
+        )
+        return self.export_response(
+            request, iter_rows(logs), timezone.now().strftime("%Y%m%dT%H%M%SZ")
+        )
+
+
+class ActivityLogArchiveListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        archives = ActivityLogArchive.objects.all()
+        serializer = ActivityLogArchiveSerializer(archives, many=True)
+        return Response(serializer.data)
+
+
+class ActivityLogArchiveView(ActivityLogQueryMixin, APIView):
+    """
+    Streams the archived logs of one month, read back from its archive
+    files. Takes the list filters and the export output options.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, year, month):
+        if not 1 <= month <= 12:
+            raise Http404("No archive for this month")
+        archives = list(ActivityLogArchive.objects.filter(month__year=year, month__month=month))
+        if not archives:
+            raise Http404("No archive for this month")
+        params = self.filter_params(request)
+
+        log_activity(
+            request=request,
+            user=request.user,
+            action="LOG_ARCHIVE_READ",
+            details={"month": f"{year:04d}-{month:02d}", **request.query_params.dict()},
+            status="success",
+        )
+        return self.export_response(
+            request,
+            iter_archived_rows(archives, params.validated_data),
+            f"{year:04d}-{month:02d}",
+        )
+
+
+class ActivityLogStatsView(APIView):
+    """
+    Log counts per ?interval=hour (default) or day from the rollups,
+    optionally per action or status (?group_by=). Covers the last 7 days
+    unless ?since=/?until= say otherwise; buckets are whole hours that
+    start in that range.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = ActivityLogStatsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        until = data.get('until') or timezone.now()
+        since = data.get('since') or until - timedelta(days=7)
+        rollups = ActivityLogRollup.objects.filter(hour__gte=since, hour__lt=until)
+        for field in ('action', 'status'):
+            if field in data:
+                rollups = rollups.filter(**{field: data[field]})
+
+        bucket = TruncDay('hour') if data['interval'] == 'day' else F('hour')
+        groups = [data['group_by']] if 'group_by' in data else []
+        series = (
+            rollups.order_by()
+            .annotate(time=bucket)
+            .values('time', *groups)
+            .annotate(count=Sum('count'))
+            .order_by('time', *groups)
+        )
+
+        watermark = ActivityLogRollupWatermark.objects.filter(pk=1).first()
+        return Response({
+            "interval": data['interval'],
+            "since": since,
+            "until": until,
+            #logs written after this are not counted yet
+            "updated_at": watermark.updated_at if watermark else None,
+            "results": list(series),
+        })
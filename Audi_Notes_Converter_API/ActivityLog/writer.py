@@ -0,0 +1,197 @@
+"""
+Buffered ActivityLog persistence. log_activity() only queues an entry;
+a background thread writes queued entries with bulk_create (and to the
+file loggers) once BATCH_SIZE entries are waiting or FLUSH_INTERVAL
+seconds have passed, so requests don't wait for the INSERT.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .models import ActivityLog
+
+# Overflow policies, when MAX_QUEUE entries are already waiting
+OVERFLOW_SYNC = "sync"    # write the entry in the caller, nothing is lost
+OVERFLOW_BLOCK = "block"  # wait for room in the queue
+OVERFLOW_DROP = "drop"    # discard the entry and count it
+
+_STOP = object()
+
+
+class ActivityLogWriter:
+    def __init__(self, batch_size=100, flush_interval=1.0, max_queue=10000, overflow=OVERFLOW_SYNC):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.dropped = 0
+        self._reset()
+
+    def _reset(self):
+        #also runs in forked children: the parent's thread does not exist there
+        self._lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self.thread = None
+        self.pid = os.getpid()
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid != os.getpid():
+                self._reset()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name="activity-log-writer", daemon=True
+                )
+                self.thread.start()
+
+    # Producer side
+    def write(self, entry, category):
+        """
+        Queue an unsaved ActivityLog for the background thread.
+        """
+        self._ensure_thread()
+        item = (entry, category)
+
+        if self.overflow == OVERFLOW_BLOCK:
+            self.queue.put(item)
+            return
+
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logging.getLogger("errors").error(
+                        "Activity log queue full, %s entries dropped so far", self.dropped
+                    )
+                return
+            persist([item])
+
+    def flush(self, timeout=None):
+        """
+        Block until everything queued so far is written.
+        Returns False if the timeout expired first.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=5.0):
+        #flush what is queued and stop the thread (atexit)
+        if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+    # Background thread
+    def _run(self):
+        batch = []
+        deadline = None
+
+        while True:
+            #idle: sleep until something is queued, otherwise until the batch is due
+            timeout = None if not batch else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            stopping = item is _STOP
+            if stopping:
+                self.queue.task_done()
+            elif item is not None:
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                try:
+                    close_old_connections()
+                    persist(batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+                batch = []
+
+            if stopping:
+                connection.close()
+                return
+
+
+def persist(items):
+    """
+    Write (entry, category) pairs: one INSERT for all entries, then one
+    line per entry in the category's file logger.
+    """
+    from .utils import LOGGERS
+
+    entries = [entry for entry, _ in items]
+    try:
+        ActivityLog.objects.bulk_create(entries)
+    except Exception:
+        #one bad row must not lose the whole batch
+        for entry in entries:
+            try:
+                entry.save()
+            except Exception as e:
+                logging.getLogger("errors").error(
+                    "Activity log write failed (%s): %s", entry.action, e, exc_info=True
+                )
+
+    for entry, category in items:
+        logger = LOGGERS.get(category, LOGGERS["errors"])
+        logger.info(
+            "[%s] user=%s ip=%s action=%s details=%s",
+            entry.status.upper(),
+            entry.user_id or "anonymous",
+            entry.ip_address,
+            entry.action,
+            entry.details,
+        )
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def close_writer(timeout=5.0):
+    """
+    Write what this process queued and stop its thread. For processes
+    that end without running atexit, like multiprocessing children,
+    which leave through os._exit().
+    """
+    if _writer is not None:
+        _writer.close(timeout)
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = settings.ACTIVITY_LOG_WRITER
+                _writer = ActivityLogWriter(
+                    batch_size=config["BATCH_SIZE"],
+                    flush_interval=config["FLUSH_INTERVAL"],
+                    max_queue=config["MAX_QUEUE"],
+                    overflow=config["OVERFLOW"],
+                )
+                atexit.register(_writer.close)
+                if hasattr(os, "register_at_fork"):
+                    os.register_at_fork(after_in_child=_writer._reset)
+    return _writer
@@ -0,0 +1,187 @@
+"""
+Keyset (cursor) pagination. Pages are fetched with a WHERE on the last
+row's ordering values instead of OFFSET, so every page costs the same
+whatever its depth, and the total count is only computed on request.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates on `ordering`, which must end with a unique field so every
+    row has a distinct position. Views may override it with an `ordering`
+    attribute. Back it with an index on the filter columns followed by the
+    ordering columns.
+    """
+    ordering = ('-id',)
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'ordering', None) or self.ordering)
+        self.page_size = self.get_page_size(request)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+        #total of the unfiltered queryset, only when asked for: COUNT(*) is not free
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = cursor is not None and cursor['reverse']
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self._after(ordering, cursor['values']))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None and (has_more if reverse else True)
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # Cursors
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f"-{field}"
+
+    def _after(self, ordering, values):
+        """
+        Rows strictly after `values` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        names = [field.lstrip('-') for field in ordering]
+        condition = Q()
+        for i, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f"{names[i]}__{lookup}": values[i]})
+            for j in range(i):
+                step &= Q(**{names[j]: values[j]})
+            condition |= step
+        return condition
+
+    def _position(self, row):
+        values = []
+        for field in self.fields:
+            value = getattr(row, field)
+            #full precision, a truncated timestamp would skip or repeat rows
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return values
+
+    def encode_cursor(self, row, reverse):
+        payload = json.dumps({'v': self._position(row), 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            raw_values = payload['v']
+            reverse = bool(payload.get('r', False))
+            if len(raw_values) != len(self.fields):
+                raise ValueError
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, raw_values)
+            ]
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return {'values': values, 'reverse': reverse}
+
+    # Links
+    def _link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        body = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.count is not None:
+            body['count'] = self.count
+        body['results'] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'description': f"Only with ?{self.count_query_param}=true"},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor from the next or previous link',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f"Results per page, at most {self.max_page_size}",
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Include the total number of results',
+                'schema': {'type': 'boolean'},
+            },
+        ]
@@ -142,6 +142,15 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# FILE DELIVERY
+# 'django' streams downloads from Python (development), 'nginx' hands them to
+# nginx with X-Accel-Redirect, 'sendfile' to Apache/lighttpd with X-Sendfile.
+# For nginx, FILE_DELIVERY_INTERNAL_PREFIX is an `internal` location aliased
+# to MEDIA_ROOT, e.g.
+#   location /protected-media/ { internal; alias /path/to/media/; }
+FILE_DELIVERY_MODE = os.getenv('FILE_DELIVERY_MODE', 'django')
+FILE_DELIVERY_INTERNAL_PREFIX = os.getenv('FILE_DELIVERY_INTERNAL_PREFIX', '/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -185,6 +194,126 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Uploaded files are hashed while they stream in (uploaded_file.sha256),
+# identical documents then share one stored blob
+FILE_UPLOAD_HANDLERS = [
+    'Document.upload_handlers.HashingMemoryFileUploadHandler',
+    'Document.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
+# RESUMABLE DOCUMENT UPLOADS
+# Files above the 10MB single-request limit are sent in chunks of
+# DOCUMENT_UPLOAD_CHUNK_SIZE bytes; unfinished sessions expire after the TTL
+DOCUMENT_UPLOAD_CHUNK_SIZE = int(os.getenv('DOCUMENT_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+DOCUMENT_RESUMABLE_MAX_SIZE = int(os.getenv('DOCUMENT_RESUMABLE_MAX_SIZE', 500 * 1024 * 1024))
+DOCUMENT_UPLOAD_SESSION_TTL = int(os.getenv('DOCUMENT_UPLOAD_SESSION_TTL', 24 * 60 * 60))  # seconds
+
+# DEFERRED FILE DELETION
+# Files of deleted rows are queued in the database and removed by the
+# audio workers through the storage API after the transaction commits
+FILE_DELETION_BATCH_SIZE = int(os.getenv('FILE_DELETION_BATCH_SIZE', 100))
+FILE_DELETION_MAX_ATTEMPTS = int(os.getenv('FILE_DELETION_MAX_ATTEMPTS', 5))
+
+# AUDIO GENERATION QUEUE
+# Jobs are stored in the database and drained by `manage.py run_audio_workers`
+AUDIO_WORKER_PROCESSES = int(os.getenv('AUDIO_WORKER_PROCESSES', 2))
+AUDIO_WORKER_POLL_INTERVAL = float(os.getenv('AUDIO_WORKER_POLL_INTERVAL', 2))
+AUDIO_JOB_TIMEOUT = int(os.getenv('AUDIO_JOB_TIMEOUT', 30 * 60))  # seconds
+AUDIO_JOB_MAX_ATTEMPTS = int(os.getenv('AUDIO_JOB_MAX_ATTEMPTS', 3))
+# How often each worker puts jobs of crashed workers back in the queue
+AUDIO_STALE_CHECK_INTERVAL = int(os.getenv('AUDIO_STALE_CHECK_INTERVAL', 60))  # seconds
+# Jobs running at once across all workers, shared round-robin between users
+AUDIO_MAX_CONCURRENT_JOBS = int(os.getenv('AUDIO_MAX_CONCURRENT_JOBS', 4))
+AUDIO_BATCH_MAX_DOCUMENTS = int(os.getenv('AUDIO_BATCH_MAX_DOCUMENTS', 500))
+
+# PDF TEXT EXTRACTION
+# PDFs with at least PARALLEL_MIN_PAGES pages are split into page ranges
+# extracted by a process pool; MAX_MEMORY_MB caps each process, or how much
+# the worker may grow when a smaller PDF is extracted in-process (0 = no cap)
+PDF_EXTRACTION_PROCESSES = int(os.getenv('PDF_EXTRACTION_PROCESSES', os.cpu_count() or 1))
+PDF_EXTRACTION_PAGES_PER_TASK = int(os.getenv('PDF_EXTRACTION_PAGES_PER_TASK', 25))
+PDF_EXTRACTION_PARALLEL_MIN_PAGES = int(os.getenv('PDF_EXTRACTION_PARALLEL_MIN_PAGES', 150))
+PDF_EXTRACTION_MAX_MEMORY_MB = int(os.getenv('PDF_EXTRACTION_MAX_MEMORY_MB', 1024))
+# Generation waits this long (seconds) for text a worker is extracting,
+# then treats that extraction as stuck and runs it itself
+DOCUMENT_TEXT_WAIT_TIMEOUT = int(os.getenv('DOCUMENT_TEXT_WAIT_TIMEOUT', 300))
+
+# TEXT TO SPEECH
+# Text is split into sentence-aligned chunks synthesized on a thread pool
+AUDIO_TTS_LANGUAGE = os.getenv('AUDIO_TTS_LANGUAGE', 'en')
+AUDIO_TTS_CHUNK_CHARS = int(os.getenv('AUDIO_TTS_CHUNK_CHARS', 1000))
+AUDIO_TTS_MAX_WORKERS = int(os.getenv('AUDIO_TTS_MAX_WORKERS', 4))
+# Chunks synthesized ahead of the one being written, bounds audio held in memory
+AUDIO_TTS_MAX_PENDING = int(os.getenv('AUDIO_TTS_MAX_PENDING', 2 * AUDIO_TTS_MAX_WORKERS))
+# Cached chunk audio unused for this many days is removed by `manage.py prune_audio_segments`
+AUDIO_SEGMENT_MAX_AGE_DAYS = int(os.getenv('AUDIO_SEGMENT_MAX_AGE_DAYS', 30))
+
+# 'gtts' (network) or 'synthetic' (offline, for benchmarks and load tests),
+# or a dotted path to an Audio.backends.BaseTTSBackend subclass
+AUDIO_TTS_BACKEND = {
+    'BACKEND': os.getenv('AUDIO_TTS_BACKEND', 'gtts'),
+    'OPTIONS': {
+        # synthetic backend: spoken pace and simulated synthesis speed (0 = instant)
+        'words_per_minute': int(os.getenv('AUDIO_TTS_SYNTHETIC_WPM', 150)),
+        'chars_per_second': float(os.getenv('AUDIO_TTS_SYNTHETIC_CPS', 0)),
+    },
+}
+
+# AUDIO RENDITIONS
+# Compact encodings of the generated audio, queued on first download
+# (?profile=<name> or an Accept header naming CONTENT_TYPE) and transcoded
+# with ffmpeg by the audio workers; a failed one is retried after TIMEOUT
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+AUDIO_RENDITION_TIMEOUT = int(os.getenv('AUDIO_RENDITION_TIMEOUT', 300))  # seconds
+AUDIO_RENDITIONS = {
+    # mono 32 kbps MP3, plays everywhere
+    'speech': {
+        'EXTENSION': 'mp3',
+        'CONTENT_TYPE': 'audio/mpeg',
+        'FFMPEG_ARGS': ['-ac', '1', '-ar', '22050', '-codec:a', 'libmp3lame', '-b:a', '32k'],
+    },
+    # mono 24 kbps Opus tuned for voice, smallest
+    'opus': {
+        'EXTENSION': 'ogg',
+        'CONTENT_TYPE': 'audio/ogg',
+        'FFMPEG_ARGS': ['-ac', '1', '-codec:a', 'libopus', '-b:a', '24k', '-application', 'voip'],
+    },
+}
+
+# ACTIVITY LOG WRITER
+# Activity log entries are queued and saved with bulk inserts by a background
+# thread, every BATCH_SIZE entries or FLUSH_INTERVAL seconds. When MAX_QUEUE
+# entries are waiting, OVERFLOW decides: 'sync' (write in the request),
+# 'block' (wait for room) or 'drop'
+ACTIVITY_LOG_WRITER = {
+    'ENABLED': os.getenv('ACTIVITY_LOG_BUFFERED', 'True') == 'True',
+    'BATCH_SIZE': int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100)),
+    'FLUSH_INTERVAL': float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 1.0)),  # seconds
+    'MAX_QUEUE': int(os.getenv('ACTIVITY_LOG_MAX_QUEUE', 10000)),
+    'OVERFLOW': os.getenv('ACTIVITY_LOG_OVERFLOW', 'sync'),
+}
+
+# ACTIVITY LOG EXPORT
+# Exports read the table in keyset batches of this many rows
+ACTIVITY_LOG_EXPORT_CHUNK_SIZE = int(os.getenv('ACTIVITY_LOG_EXPORT_CHUNK_SIZE', 2000))
+
+# ACTIVITY LOG RETENTION
+# `manage.py archive_activity_logs` moves each month (UTC) whose rows are all
+# older than RETENTION_DAYS to a gzipped NDJSON archive, then deletes those
+# rows DELETE_BATCH_SIZE at a time
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv('ACTIVITY_LOG_RETENTION_DAYS', 90))
+ACTIVITY_LOG_DELETE_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_DELETE_BATCH_SIZE', 1000))
+
+# ACTIVITY LOG ROLLUPS
+# Hourly counts per action and status for dashboards, updated by
+# `manage.py rollup_activity_logs` from a watermark, BATCH_SIZE log ids per
+# transaction. Logs younger than LAG seconds wait for the next run, their
+# ids may still have uncommitted lower neighbours
+ACTIVITY_LOG_ROLLUP = {
+    'BATCH_SIZE': int(os.getenv('ACTIVITY_LOG_ROLLUP_BATCH_SIZE', 50000)),
+    'LAG': int(os.getenv('ACTIVITY_LOG_ROLLUP_LAG', 60)),  # seconds
+}
+
 # LOGGING CONFIGURATION
 LOGS_DIR = BASE_DIR / "logs"
 
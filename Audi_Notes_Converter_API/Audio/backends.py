@@ -0,0 +1,86 @@
+import io
+import math
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Short names accepted by settings.AUDIO_TTS_BACKEND['BACKEND']
+BACKENDS = {
+    "gtts": "Audio.backends.GTTSBackend",
+    "synthetic": "Audio.backends.SyntheticTTSBackend",
+}
+
+
+class BaseTTSBackend:
+    """
+    A text-to-speech engine. Subclasses return mp3 bytes for a chunk of text
+    and must be safe to call from several threads at once.
+    """
+    name = None
+
+    def __init__(self, **options):
+        self.options = options
+
+    @property
+    def voice(self):
+        #identifies the sound of the output, part of the audio cache key
+        return self.name
+
+    def synthesize(self, text, lang):
+        raise NotImplementedError
+
+
+class GTTSBackend(BaseTTSBackend):
+    #Google Translate TTS, needs network access
+    name = "gtts"
+
+    def synthesize(self, text, lang):
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class SyntheticTTSBackend(BaseTTSBackend):
+    """
+    Offline, deterministic engine for benchmarks and load tests.
+    Emits silent MPEG-1 Layer III frames whose total length follows the
+    word count, after sleeping to simulate a given synthesis speed.
+    """
+    name = "synthetic"
+
+    # MPEG-1 Layer III, 32 kbps, 32 kHz, mono, no CRC, no padding
+    FRAME_HEADER = b"\xff\xfb\x18\xc0"
+    FRAME_SIZE = 144  # 144 * bitrate / sample rate
+    FRAME_SECONDS = 1152 / 32000
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.words_per_minute = options.get("words_per_minute", 150)
+        # 0 means synthesize instantly
+        self.chars_per_second = options.get("chars_per_second", 0)
+        # zeroed side info and main data decode as silence
+        self.frame = self.FRAME_HEADER + bytes(self.FRAME_SIZE - len(self.FRAME_HEADER))
+
+    @property
+    def voice(self):
+        return f"{self.name}:{self.words_per_minute}wpm"
+
+    def synthesize(self, text, lang):
+        if self.chars_per_second:
+            time.sleep(len(text) / self.chars_per_second)
+
+        seconds = len(text.split()) * 60 / self.words_per_minute
+        frames = max(1, math.ceil(seconds / self.FRAME_SECONDS))
+        return self.frame * frames
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    config = settings.AUDIO_TTS_BACKEND
+    path = BACKENDS.get(config["BACKEND"], config["BACKEND"])
+    backend_class = import_string(path)
+    return backend_class(**config.get("OPTIONS", {}))
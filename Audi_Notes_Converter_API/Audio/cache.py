@@ -0,0 +1,169 @@
+import hashlib
+import unicodedata
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AudioBlob, AudioFile, AudioSegment
+from .tts import PARAGRAPH_BREAK
+
+
+def iter_paragraphs(text):
+    """
+    Canonical paragraphs used for the cache key, one at a time: NFC,
+    single spaces inside paragraphs, empty paragraphs dropped.
+    """
+    start = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        paragraph = " ".join(unicodedata.normalize("NFC", text[start:match.start()]).split())
+        if paragraph:
+            yield paragraph
+        start = match.end()
+
+    paragraph = " ".join(unicodedata.normalize("NFC", text[start:]).split())
+    if paragraph:
+        yield paragraph
+
+def audio_cache_key(normalized_text, lang, voice):
+    digest = hashlib.sha256()
+    digest.update(f"{voice}\n{lang}\n".encode())
+    digest.update(normalized_text.encode())
+    return digest.hexdigest()
+
+def paragraphs_cache_key(paragraphs, lang, voice):
+    #same key as audio_cache_key("\n\n".join(paragraphs)), without the joined copy
+    digest = hashlib.sha256()
+    digest.update(f"{voice}\n{lang}\n".encode())
+    for index, paragraph in enumerate(paragraphs):
+        if index:
+            digest.update(b"\n\n")
+        digest.update(paragraph.encode())
+    return digest.hexdigest()
+
+def find_blob(key):
+    blob = AudioBlob.objects.filter(content_hash=key).first()
+    #a row whose file went missing is useless, synthesize again
+    if blob and blob.audio_file.storage.exists(blob.audio_file.name):
+        return blob
+    return None
+
+def store_blob(key, fp, size, duration=None):
+    """
+    Save synthesized audio under its content hash. If another worker stored
+    the same key meanwhile, keep theirs.
+    """
+    blob = AudioBlob(content_hash=key, file_size=size, duration=duration)
+    blob.audio_file.save(f"{key}.mp3", fp, save=False)
+
+    try:
+        with transaction.atomic():
+            blob.save()
+        return blob
+    except IntegrityError:
+        existing = AudioBlob.objects.get(content_hash=key)
+
+    #when the row's file went missing, ours was written under the same name
+    if (blob.audio_file.name != existing.audio_file.name
+            and existing.audio_file.storage.exists(existing.audio_file.name)):
+        blob.audio_file.delete(save=False)
+        return existing
+
+    #repair a blob whose file went missing
+    existing.audio_file.name = blob.audio_file.name
+    existing.file_size = size
+    existing.duration = duration
+    existing.save(update_fields=['audio_file', 'file_size', 'duration'])
+    AudioFile.objects.filter(blob=existing).update(
+        audio_file=existing.audio_file.name, file_size=size, duration=duration
+    )
+    return existing
+
+def attach_blob(audio, blob):
+    """
+    Point `audio` at the blob's bytes and move its reference from the
+    previous blob (if any). Returns False if the blob vanished meanwhile.
+    """
+    previous = audio.blob if audio.blob_id and audio.blob_id != blob.id else None
+
+    with transaction.atomic():
+        if audio.blob_id != blob.id and not blob.acquire():
+            return False
+
+        audio.blob = blob
+        audio.audio_file.name = blob.audio_file.name
+        audio.file_size = blob.file_size
+        audio.duration = blob.duration
+        audio.save()
+
+    if previous is not None:
+        previous.release()
+    return True
+
+
+# Segment cache
+def find_segments(keys):
+    #returns {key: AudioSegment} for the chunks that were synthesized before
+    segments = {
+        segment.content_hash: segment
+        for segment in AudioSegment.objects.filter(content_hash__in=set(keys))
+    }
+    if segments:
+        AudioSegment.objects.filter(pk__in=[s.pk for s in segments.values()]).update(
+            last_used_at=timezone.now()
+        )
+    return segments
+
+def store_segment(key, data):
+    segment = AudioSegment(content_hash=key, file_size=len(data))
+    segment.audio_file.save(f"{key}.mp3", ContentFile(data), save=False)
+
+    try:
+        with transaction.atomic():
+            segment.save()
+        return segment
+    except IntegrityError:
+        existing = AudioSegment.objects.get(content_hash=key)
+
+    #stored concurrently by another worker, keep theirs unless its file is
+    #gone (ours then took the same name)
+    if (segment.audio_file.name != existing.audio_file.name
+            and existing.audio_file.storage.exists(existing.audio_file.name)):
+        segment.audio_file.delete(save=False)
+        return existing
+
+    existing.audio_file.name = segment.audio_file.name
+    existing.file_size = segment.file_size
+    existing.save(update_fields=['audio_file', 'file_size', 'last_used_at'])
+    return existing
+
+def read_segment(segment):
+    with segment.audio_file.storage.open(segment.audio_file.name, "rb") as f:
+        return f.read()
+
+def prune_segments(max_age_days=None, batch_size=500):
+    """
+    Delete segments no generation has used for `max_age_days`, a batch per
+    transaction. Their files are queued for deletion by the post_delete
+    signal. Returns the number of segments deleted.
+    """
+    max_age_days = settings.AUDIO_SEGMENT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    deleted = 0
+
+    while True:
+        with transaction.atomic():
+            #skip_locked: a segment being refreshed by find_segments is left alone
+            ids = list(
+                AudioSegment.objects
+                .select_for_update(skip_locked=True)
+                .filter(last_used_at__lt=cutoff)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            AudioSegment.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
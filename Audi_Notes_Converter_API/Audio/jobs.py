@@ -0,0 +1,304 @@
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import AudioGenerationJob
+from .renditions import run_next_rendition
+from .services import AudioGenerationError, generate_audio
+
+from Document.extraction import run_next_extraction
+from Document.file_cleanup import purge_pending_deletions
+from ActivityLog.utils import log_activity
+from ActivityLog.writer import close_writer
+
+logger = logging.getLogger("audio")
+
+
+# Queue operations
+def enqueue_generation(document, user, batch=None):
+    """
+    Persist the request, a worker process picks it up later.
+    Generation is single-flight per document: the unique `in_flight` column
+    holds the document id while a job is queued or running, so a concurrent
+    request attaches to that job instead of queueing a second one.
+    Returns (job, created).
+    """
+    try:
+        with transaction.atomic():
+            job = AudioGenerationJob.objects.create(
+                document=document, user=user, batch=batch, in_flight=document.id
+            )
+        return job, True
+    except IntegrityError:
+        pass
+
+    job = AudioGenerationJob.objects.filter(in_flight=document.id).first()
+    if job is None:
+        #the in-flight job finished in between, try again
+        return enqueue_generation(document, user, batch)
+    return job, False
+
+def enqueue_batch(documents, user):
+    """
+    Queue one job per document in a single INSERT. Documents that already
+    have a job in flight are attached to it instead.
+    Returns (batch id, {document id: in-flight job id}); batch jobs are
+    looked up by the batch id (bulk_create does not return ids on MySQL).
+    """
+    in_flight = dict(
+        AudioGenerationJob.objects
+        .filter(in_flight__in=[d.id for d in documents])
+        .values_list('in_flight', 'id')
+    )
+
+    batch = uuid.uuid4()
+    AudioGenerationJob.objects.bulk_create(
+        [
+            AudioGenerationJob(document=document, user=user, batch=batch, in_flight=document.id)
+            for document in documents
+            if document.id not in in_flight
+        ],
+        #a job queued meanwhile by another request wins
+        ignore_conflicts=True,
+    )
+
+    #rows skipped by ignore_conflicts: attach to the job that won, or queue
+    #again if that job already finished
+    inserted = set(
+        AudioGenerationJob.objects.filter(batch=batch).values_list('document_id', flat=True)
+    )
+    for document in documents:
+        if document.id in in_flight or document.id in inserted:
+            continue
+        job, created = enqueue_generation(document, user, batch)
+        if not created:
+            in_flight[document.id] = job.id
+
+    return batch, in_flight
+
+def _users_by_fairness(running_by_user):
+    """
+    Users with queued jobs, the least served first: fewest running jobs,
+    then the longest since one of their jobs started, then oldest request.
+    This round-robins capacity across users regardless of queue depth.
+    """
+    queued = (
+        AudioGenerationJob.objects
+        .filter(status=AudioGenerationJob.STATUS_QUEUED)
+        .values('user_id')
+        .annotate(oldest=Min('created_at'))
+    )
+    oldest = {row['user_id']: row['oldest'] for row in queued}
+    if not oldest:
+        return []
+
+    last_started = dict(
+        AudioGenerationJob.objects
+        .filter(user_id__in=oldest, started_at__isnull=False)
+        .values('user_id')
+        .annotate(last=Max('started_at'))
+        .values_list('user_id', 'last')
+    )
+    never = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+    return sorted(
+        oldest,
+        key=lambda user_id: (
+            running_by_user.get(user_id, 0),
+            last_started.get(user_id, never),
+            oldest[user_id],
+        ),
+    )
+
+def claim_next_job(worker_name):
+    """
+    Atomically move the next queued job to running, honouring the global
+    concurrency limit and round-robin fairness between users.
+    SKIP LOCKED lets several workers poll the table without blocking each other.
+    """
+    with transaction.atomic():
+        #locking read: sees jobs other workers just started and makes
+        #concurrent claims wait for each other
+        running = list(
+            AudioGenerationJob.objects
+            .select_for_update()
+            .filter(status=AudioGenerationJob.STATUS_RUNNING)
+            .values_list('user_id', flat=True)
+        )
+        if len(running) >= settings.AUDIO_MAX_CONCURRENT_JOBS:
+            return None
+
+        job = None
+        for user_id in _users_by_fairness(Counter(running)):
+            job = (
+                AudioGenerationJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(user_id=user_id, status=AudioGenerationJob.STATUS_QUEUED)
+                .order_by('created_at')
+                .first()
+            )
+            if job is not None:
+                break
+
+        if job is None:
+            return None
+
+        job.status = AudioGenerationJob.STATUS_RUNNING
+        job.progress = 0
+        job.attempts += 1
+        job.worker = worker_name
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'progress', 'attempts', 'worker', 'started_at'])
+
+    return job
+
+def requeue_stale_jobs():
+    #jobs left running by a crashed worker go back to the queue
+    cutoff = timezone.now() - timedelta(seconds=settings.AUDIO_JOB_TIMEOUT)
+    stale = AudioGenerationJob.objects.filter(
+        status=AudioGenerationJob.STATUS_RUNNING,
+        started_at__lt=cutoff,
+    )
+
+    failed = stale.filter(attempts__gte=settings.AUDIO_JOB_MAX_ATTEMPTS).update(
+        status=AudioGenerationJob.STATUS_FAILED,
+        error="Job timed out",
+        finished_at=timezone.now(),
+        in_flight=None,
+    )
+    requeued = stale.update(status=AudioGenerationJob.STATUS_QUEUED, worker='')
+
+    return requeued, failed
+
+
+# Job execution
+def _finish(job, status, error=""):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    #the document can be queued again
+    job.in_flight = None
+    if status == AudioGenerationJob.STATUS_DONE:
+        job.progress = 100
+    job.save(update_fields=['status', 'error', 'finished_at', 'progress', 'stats', 'in_flight'])
+
+def run_job(job):
+    def report(percent):
+        AudioGenerationJob.objects.filter(pk=job.pk).update(progress=percent)
+
+    document = job.document
+
+    try:
+        audio, stats = generate_audio(document, progress=report)
+
+    except AudioGenerationError as e:
+        _finish(job, AudioGenerationJob.STATUS_FAILED, str(e))
+        log_activity(
+            user=job.user,
+            action="AUDIO_GENERATE",
+            details=f"Generation failed (Document ID {document.id}, Job ID {job.id}): {str(e)}",
+            category="audio",
+            status="failed",
+        )
+        return job
+
+    except Exception as e:
+        logger.exception("Audio job %s failed", job.id)
+
+        if job.attempts < settings.AUDIO_JOB_MAX_ATTEMPTS:
+            #transient failure (network, storage), try again later
+            job.status = AudioGenerationJob.STATUS_QUEUED
+            job.error = str(e)
+            job.worker = ''
+            job.save(update_fields=['status', 'error', 'worker'])
+            return job
+
+        _finish(job, AudioGenerationJob.STATUS_FAILED, str(e))
+        log_activity(
+            user=job.user,
+            action="AUDIO_GENERATE",
+            details=f"Generation failed (Document ID {document.id}, Job ID {job.id}): {str(e)}",
+            category="audio",
+            status="failed",
+        )
+        return job
+
+    job.stats = stats
+    _finish(job, AudioGenerationJob.STATUS_DONE)
+    log_activity(
+        user=job.user,
+        action="AUDIO_GENERATE",
+        details=(
+            f"Audio reused from cache (Document ID {document.id}, Job ID {job.id})"
+            if stats["cache_hit"] else
+            f"Audio generated (Document ID {document.id}, Job ID {job.id}, {stats['chunks']} chunks in {stats['synthesis_seconds']}s)"
+        ),
+        category="audio",
+        status="success",
+    )
+    return job
+
+
+# Worker loop
+def _requeue_stale():
+    requeued, failed = requeue_stale_jobs()
+    if requeued or failed:
+        logger.warning("Requeued %s stale audio job(s), failed %s", requeued, failed)
+
+def _work_once(worker_name):
+    #run one job, else one rendition, extraction or deletion batch; False when idle
+    job = claim_next_job(worker_name)
+    if job is not None:
+        run_job(job)
+        return True
+    #idle: transcode requested renditions, extract pending document text,
+    #then remove deleted files
+    return bool(run_next_rendition() or run_next_extraction() or purge_pending_deletions())
+
+def run_worker(poll_interval=None, once=False):
+    """
+    Drain the audio queue, then queued renditions, pending document text
+    extractions and queued file deletions, until interrupted (or until all are empty when
+    `once` is set)
+    """
+    poll_interval = poll_interval or settings.AUDIO_WORKER_POLL_INTERVAL
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    next_stale_check = 0
+    #terminate() from the pool sends SIGTERM, unwind so the finally below runs
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+    try:
+        while True:
+            close_old_connections()
+            try:
+                if time.monotonic() >= next_stale_check:
+                    _requeue_stale()
+                    next_stale_check = time.monotonic() + settings.AUDIO_STALE_CHECK_INTERVAL
+                busy = _work_once(worker_name)
+            except Exception:
+                #a lost connection or a bad row must not take the worker down
+                logger.exception("Audio worker %s iteration failed", worker_name)
+                busy = False
+
+            if busy:
+                continue
+            if once:
+                return
+            time.sleep(poll_interval)
+    finally:
+        #pool children exit without atexit, write their buffered activity logs now
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        close_writer()
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
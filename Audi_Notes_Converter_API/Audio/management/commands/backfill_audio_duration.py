@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from Audio.models import AudioBlob, AudioFile
+from Audio.mp3 import probe_file
+
+
+def probe_duration(instance):
+    try:
+        info = probe_file(instance.audio_file)
+    except OSError:
+        return instance, None
+    return instance, round(info.duration) if info else None
+
+
+class Command(BaseCommand):
+    help = "Fill in missing audio durations by scanning MP3 frame headers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows probed and updated per batch',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Files probed in parallel',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for model in (AudioBlob, AudioFile):
+                updated, missing = self.backfill(model, pool, options['batch_size'])
+                self.stdout.write(
+                    f"{model.__name__}: {updated} updated, {missing} unreadable"
+                )
+
+        self.stdout.write(f"Done in {time.perf_counter() - started:.2f}s")
+
+    def backfill(self, model, pool, batch_size):
+        updated = missing = 0
+        last_id = 0
+
+        while True:
+            #keyset over the primary key, rows already filled drop out of the filter
+            batch = list(
+                model.objects
+                .filter(duration__isnull=True, id__gt=last_id)
+                .order_by('id')
+                .only('id', 'audio_file')[:batch_size]
+            )
+            if not batch:
+                return updated, missing
+            last_id = batch[-1].id
+
+            changed = []
+            for instance, duration in pool.map(probe_duration, batch):
+                if duration is None:
+                    missing += 1
+                    continue
+                instance.duration = duration
+                changed.append(instance)
+
+            model.objects.bulk_update(changed, ['duration'])
+            updated += len(changed)
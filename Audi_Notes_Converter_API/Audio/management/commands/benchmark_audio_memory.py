@@ -0,0 +1,89 @@
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from Audio.backends import get_backend
+from Audio.cache import iter_paragraphs
+from Audio.mp3 import strip_tags
+from Audio.tts import concatenate_mp3, iter_chunks, split_text, synthesize_chunks, synthesize_stream
+
+SAMPLE_SENTENCE = "The quick brown fox jumps over the lazy dog near the river bank."
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare peak memory of buffered and streaming audio generation on a "
+        "generated document, using the offline synthetic TTS backend"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=500,
+            help='Pages of generated text',
+        )
+        parser.add_argument(
+            '--words-per-page',
+            type=int,
+            default=300,
+            help='Words on each page',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['buffered', 'streaming', 'both'],
+            default='both',
+        )
+
+    def handle(self, *args, **options):
+        sentences_per_page = max(options['words_per_page'] // len(SAMPLE_SENTENCE.split()), 1)
+        #one paragraph per page
+        text = "\n\n".join(
+            " ".join([SAMPLE_SENTENCE] * sentences_per_page) for _ in range(options['pages'])
+        )
+        self.stdout.write(f"{options['pages']} pages, {len(text)} chars of text")
+
+        modes = ['streaming', 'buffered'] if options['mode'] == 'both' else [options['mode']]
+        with override_settings(AUDIO_TTS_BACKEND={'BACKEND': 'synthetic', 'OPTIONS': {}}):
+            get_backend.cache_clear()
+            try:
+                for mode in modes:
+                    self.measure(mode, text)
+            finally:
+                get_backend.cache_clear()
+
+    def measure(self, mode, text):
+        run = self.run_streaming if mode == 'streaming' else self.run_buffered
+
+        with tempfile.TemporaryFile() as fp:
+            #the text itself is allocated before tracing starts
+            tracemalloc.start()
+            started = time.perf_counter()
+            chunks, size = run(text, fp)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.stdout.write(
+            f"{mode}: {chunks} chunks, {size / 1024 / 1024:.1f} MB of audio in {elapsed:.2f}s, "
+            f"peak traced memory {peak / 1024 / 1024:.1f} MB"
+        )
+
+    def run_buffered(self, text, fp):
+        #the previous pipeline: every chunk's audio is held until all are done
+        chunks = split_text("\n\n".join(iter_paragraphs(text)))
+        parts, _ = synthesize_chunks(chunks)
+        return len(chunks), concatenate_mp3(parts, fp)
+
+    def run_streaming(self, text, fp):
+        count = size = 0
+        items = ((chunk, None) for chunk in iter_chunks(iter_paragraphs(text)))
+        for _, _, data, _ in synthesize_stream(items):
+            part = strip_tags(data)
+            fp.write(part)
+            size += len(part)
+            count += 1
+        return count, size
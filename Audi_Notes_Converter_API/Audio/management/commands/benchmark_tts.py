@@ -0,0 +1,98 @@
+import io
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Audio.backends import get_backend
+from Audio.cache import iter_paragraphs
+from Audio.mp3 import strip_tags
+from Audio.tts import concatenate_mp3, iter_chunks, split_text, synthesize_chunks, synthesize_stream
+from Document.extraction import TextExtractionError, get_document_text
+from Document.models import Document
+
+SAMPLE_SENTENCE = "The quick brown fox jumps over the lazy dog near the river bank."
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure audio generation throughput with the configured TTS backend. "
+        "Set AUDIO_TTS_BACKEND=synthetic to run without network access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--words',
+            type=int,
+            default=20000,
+            help='Size of the generated sample text',
+        )
+        parser.add_argument(
+            '--document-id',
+            type=int,
+            help=(
+                'Synthesize the text of this document instead, with the audio caches '
+                'bypassed and nothing stored'
+            ),
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of runs',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        self.stdout.write(
+            f"Backend: {backend.name}, workers: {settings.AUDIO_TTS_MAX_WORKERS}, "
+            f"chunk size: {settings.AUDIO_TTS_CHUNK_CHARS} chars"
+        )
+
+        if options['document_id']:
+            try:
+                document = Document.objects.get(id=options['document_id'])
+            except Document.DoesNotExist:
+                raise CommandError("Document not found")
+            try:
+                #extracted once, the runs measure synthesis
+                text = get_document_text(document).text
+            except TextExtractionError as e:
+                raise CommandError(f"Could not read document: {e}")
+            run = lambda: self.run_document(text)
+        else:
+            sentences = options['words'] // len(SAMPLE_SENTENCE.split()) + 1
+            text = "\n\n".join(
+                " ".join([SAMPLE_SENTENCE] * 5) for _ in range(sentences // 5 + 1)
+            )
+            run = lambda: self.run_text(text)
+
+        for i in range(options['repeat']):
+            started = time.perf_counter()
+            chars, chunks, size = run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Run {i + 1}: {chars} chars, {chunks} chunks, {size} bytes in {elapsed:.3f}s "
+                f"({chars / elapsed:.0f} chars/s)"
+            )
+
+    def run_text(self, text):
+        chunks = split_text(text)
+        parts, timings = synthesize_chunks(chunks)
+        size = concatenate_mp3(parts, io.BytesIO())
+        return len(text), len(chunks), size
+
+    def run_document(self, text):
+        #generate_audio's streaming pipeline minus the caches: every chunk is
+        #synthesized, the audio goes to a scratch file, the document is untouched
+        chars = chunks = size = 0
+        items = ((chunk, None) for chunk in iter_chunks(iter_paragraphs(text)))
+        with tempfile.TemporaryFile() as scratch:
+            for chunk, _, data, _ in synthesize_stream(items):
+                part = strip_tags(data)
+                scratch.write(part)
+                chars += len(chunk)
+                chunks += 1
+                size += len(part)
+        return chars, chunks, size
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Audio.cache import prune_segments
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete cached chunk audio (AudioSegment) that no generation has used "
+        "recently; the files are removed by the audio workers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.AUDIO_SEGMENT_MAX_AGE_DAYS,
+            help='Delete segments unused for this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Segments deleted per transaction',
+        )
+
+    def handle(self, *args, **options):
+        count = prune_segments(options['days'], options['batch_size'])
+        self.stdout.write(f"Pruned {count} audio segment(s)")
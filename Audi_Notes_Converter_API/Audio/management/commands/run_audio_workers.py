@@ -0,0 +1,90 @@
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Audio.jobs import requeue_stale_jobs, run_worker
+
+RESTART_DELAY = 1  # seconds
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a pool of worker processes that drain the audio generation queue "
+        "and extract the text of newly uploaded documents"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.AUDIO_WORKER_PROCESSES,
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.AUDIO_WORKER_POLL_INTERVAL,
+            help='Seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        requeued, failed = requeue_stale_jobs()
+        if requeued or failed:
+            self.stdout.write(f"Requeued {requeued} stale job(s), failed {failed}")
+
+        worker_kwargs = {
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+        }
+        processes = max(1, options['processes'])
+
+        if processes == 1:
+            run_worker(**worker_kwargs)
+            return
+
+        #forked children must not share the parent's DB connection
+        connections.close_all()
+
+        def start(name):
+            worker = multiprocessing.Process(target=run_worker, kwargs=worker_kwargs, name=name)
+            worker.start()
+            return worker
+
+        workers = [start(f"audio-worker-{i}") for i in range(processes)]
+        self.stdout.write(f"Started {processes} audio worker(s)")
+
+        try:
+            self.supervise(workers, start, options['once'])
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+
+    def supervise(self, workers, start, once):
+        """
+        Wait for the workers, starting a new one in place of any that dies.
+        With --once a worker that exits cleanly (queue drained) is not replaced.
+        """
+        while workers:
+            wait([worker.sentinel for worker in workers])
+            for i, worker in reversed(list(enumerate(workers))):
+                if worker.is_alive():
+                    continue
+                worker.join()
+                if once and worker.exitcode == 0:
+                    del workers[i]
+                    continue
+                self.stderr.write(f"{worker.name} exited with code {worker.exitcode}, restarting")
+                #do not spin when a worker dies right on startup
+                time.sleep(RESTART_DELAY)
+                workers[i] = start(worker.name)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-01-12 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0002_audiogenerationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiogenerationjob',
+            name='stats',
+            field=models.JSONField(blank=True, default=dict, help_text='Synthesis report (chunk count and per-chunk timings)'),
+        ),
+    ]
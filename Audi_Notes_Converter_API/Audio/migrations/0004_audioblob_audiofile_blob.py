@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-01-15 14:03
+
+import Audio.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0003_audiogenerationjob_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='sha256 of voice, language and normalized text', max_length=64, unique=True)),
+                ('audio_file', models.FileField(upload_to=Audio.models.audio_blob_upload_path)),
+                ('file_size', models.BigIntegerField(help_text='Audio file size bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Number of AudioFile rows using this blob')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='audiofile',
+            name='blob',
+            field=models.ForeignKey(blank=True, help_text='Shared audio this file points to (audio_file is the blob file)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='audio_files', to='Audio.audioblob'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-01-24 16:52
+
+import Audio.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0004_audioblob_audiofile_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='sha256 of voice, language and chunk text', max_length=64, unique=True)),
+                ('audio_file', models.FileField(upload_to=Audio.models.audio_segment_upload_path)),
+                ('file_size', models.BigIntegerField(help_text='Audio file size bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
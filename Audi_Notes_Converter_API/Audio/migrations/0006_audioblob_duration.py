@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-01-27 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0005_audiosegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioblob',
+            name='duration',
+            field=models.IntegerField(blank=True, help_text='Audio duration in seconds', null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-02-02 13:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0006_audioblob_duration'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiogenerationjob',
+            name='batch',
+            field=models.UUIDField(blank=True, db_index=True, help_text='Batch request this job was created by', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='audiogenerationjob',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='Audio_audio_user_id_2d6713_idx'),
+        ),
+    ]
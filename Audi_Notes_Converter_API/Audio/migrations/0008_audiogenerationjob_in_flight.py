@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-02-05 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0007_audiogenerationjob_batch_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiogenerationjob',
+            name='in_flight',
+            field=models.BigIntegerField(blank=True, help_text='Document id while the job is queued or running, NULL afterwards', null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-02-16 11:04
+
+import Audio.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0008_audiogenerationjob_in_flight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile', models.CharField(help_text='Key of settings.AUDIO_RENDITIONS', max_length=20)),
+                ('audio_file', models.FileField(upload_to=Audio.models.audio_rendition_upload_path)),
+                ('file_size', models.BigIntegerField(help_text='Audio file size bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='Audio.audioblob')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('blob', 'profile'), name='unique_rendition_per_profile')],
+            },
+        ),
+    ]
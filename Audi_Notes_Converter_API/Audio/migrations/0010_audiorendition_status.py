@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:05
+
+import Audio.models
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    #renditions stored before the queue existed were transcoded already
+    AudioRendition = apps.get_model('Audio', 'AudioRendition')
+    AudioRendition.objects.update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Audio', '0009_audiorendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiorendition',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When a worker last started transcoding it', null=True),
+        ),
+        migrations.AddField(
+            model_name='audiorendition',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='audiorendition',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='audiorendition',
+            name='audio_file',
+            field=models.FileField(blank=True, upload_to=Audio.models.audio_rendition_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='audiorendition',
+            name='file_size',
+            field=models.BigIntegerField(default=0, help_text='Audio file size bytes'),
+        ),
+        migrations.AddIndex(
+            model_name='audiorendition',
+            index=models.Index(fields=['status'], name='Audio_audio_status_7ad9c6_idx'),
+        ),
+    ]
@@ -1,14 +1,180 @@
-from django.db import models
-from django.conf import settings
-from Document.models import Document
 import os
 
+from django.db import models, transaction
+from django.conf import settings
+from Document.models import Document, PendingFileDeletion
+
 # Create your models here.
 def audio_upload_path(instance, filename):
     #store generated audio per user & document
     #media/audio/user_<id>/document_<id>/<filename>.mp3
     return f"audio/user_{instance.document.user_id}/document_{instance.document.id}/{filename}"
 
+def audio_blob_upload_path(instance, filename):
+    #shared audio is stored once per content hash
+    #media/audio/cache/<ab>/<hash>.mp3
+    return f"audio/cache/{instance.content_hash[:2]}/{instance.content_hash}.mp3"
+
+class AudioBlob(models.Model):
+    """
+    Synthesized audio shared by every AudioFile whose text, language and
+    voice hash to the same key.
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='sha256 of voice, language and normalized text'
+    )
+
+    audio_file = models.FileField(
+        upload_to=audio_blob_upload_path
+    )
+
+    file_size = models.BigIntegerField(
+        help_text='Audio file size bytes'
+    )
+
+    duration = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text='Audio duration in seconds'
+    )
+
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of AudioFile rows using this blob'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Audio blob {self.content_hash[:12]} ({self.ref_count} refs)"
+
+    def acquire(self):
+        #returns False if the blob was released concurrently
+        return AudioBlob.objects.filter(pk=self.pk).update(
+            ref_count=models.F('ref_count') + 1
+        ) == 1
+
+    def release(self):
+        #drop one reference, the file goes away with the last one
+        with transaction.atomic():
+            blob = AudioBlob.objects.select_for_update().filter(pk=self.pk).first()
+            if blob is None:
+                return
+
+            if blob.ref_count > 1:
+                blob.ref_count -= 1
+                blob.save(update_fields=['ref_count'])
+                return
+
+            #transcoded copies go with the source
+            PendingFileDeletion.schedule(
+                blob.audio_file.name,
+                *blob.renditions.values_list('audio_file', flat=True),
+            )
+            blob.delete()
+
+def audio_segment_upload_path(instance, filename):
+    #media/audio/segments/<ab>/<hash>.mp3
+    return f"audio/segments/{instance.content_hash[:2]}/{instance.content_hash}.mp3"
+
+class AudioSegment(models.Model):
+    """
+    Audio of a single text chunk, reused when a document is regenerated
+    and the chunk did not change.
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='sha256 of voice, language and chunk text'
+    )
+
+    audio_file = models.FileField(
+        upload_to=audio_segment_upload_path
+    )
+
+    file_size = models.BigIntegerField(
+        help_text='Audio file size bytes'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Audio segment {self.content_hash[:12]}"
+
+def audio_rendition_upload_path(instance, filename):
+    #media/audio/renditions/<ab>/<hash>.<profile>.<ext>
+    content_hash = instance.blob.content_hash
+    extension = filename.split('.')[-1].lower()
+    return f"audio/renditions/{content_hash[:2]}/{content_hash}.{instance.profile}.{extension}"
+
+class AudioRendition(models.Model):
+    """
+    Shared audio re-encoded with one of settings.AUDIO_RENDITIONS, queued
+    the first time the profile is downloaded and transcoded by a worker.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING,'Pending'),
+        (STATUS_PROCESSING,'Processing'),
+        (STATUS_READY,'Ready'),
+        (STATUS_FAILED,'Failed'),
+    )
+
+    blob = models.ForeignKey(
+        AudioBlob,
+        on_delete=models.CASCADE,
+        related_name='renditions'
+    )
+
+    profile = models.CharField(
+        max_length=20,
+        help_text='Key of settings.AUDIO_RENDITIONS'
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+
+    audio_file = models.FileField(
+        upload_to=audio_rendition_upload_path,
+        blank=True
+    )
+
+    file_size = models.BigIntegerField(
+        default=0,
+        help_text='Audio file size bytes'
+    )
+
+    error = models.TextField(blank=True)
+
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When a worker last started transcoding it'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['blob', 'profile'], name='unique_rendition_per_profile'),
+        ]
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f"{self.profile} rendition of {self.blob.content_hash[:12]} ({self.status})"
+
 class AudioFile(models.Model):
     document = models.OneToOneField(
         Document,
@@ -30,6 +196,15 @@ class AudioFile(models.Model):
         help_text='Audio duration in seconds'
     )
 
+    blob = models.ForeignKey(
+        AudioBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='audio_files',
+        help_text='Shared audio this file points to (audio_file is the blob file)'
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -37,10 +212,92 @@ class AudioFile(models.Model):
 
     def __str__(self):
         return f"Audio for document: {self.document.title}"
-    
-    def delete(self, *args,**kwargs):
-        #ensure audio file is deleted from storage when record is deleted
-        if self.audio_file and os.path.isfile(self.audio_file.path):
-            os.remove(self.audio_file.path)
 
-        super().delete(*args,**kwargs)
+    def download_name(self, field_file=None):
+        #named after the document, shared files have content-hash names
+        extension = os.path.splitext((field_file or self.audio_file).name)[1] or ".mp3"
+        return f"{self.document.title.replace(' ', '_')}{extension}"
+
+    # Stored files are removed by the post_delete signal (see signals.py)
+
+class AudioGenerationJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_QUEUED,'Queued'),
+        (STATUS_RUNNING,'Running'),
+        (STATUS_DONE,'Done'),
+        (STATUS_FAILED,'Failed'),
+    )
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='audio_jobs'
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='audio_jobs'
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED
+    )
+
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Completion percentage (0-100)'
+    )
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Worker that claimed the job'
+    )
+
+    stats = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Synthesis report (chunk count and per-chunk timings)'
+    )
+
+    in_flight = models.BigIntegerField(
+        null=True,
+        blank=True,
+        unique=True,
+        help_text='Document id while the job is queued or running, NULL afterwards'
+    )
+
+    batch = models.UUIDField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text='Batch request this job was created by'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            #workers poll the oldest queued job
+            models.Index(fields=['status', 'created_at']),
+            #fair scheduling picks the oldest queued job of a given user
+            models.Index(fields=['user', 'status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Audio job {self.id} for document {self.document_id} ({self.status})"
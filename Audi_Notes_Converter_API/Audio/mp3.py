@@ -0,0 +1,177 @@
+"""
+MPEG audio frame header parsing. Durations are computed from frame
+headers (or a Xing/Info/VBRI summary frame) without decoding any audio.
+"""
+from collections import namedtuple
+
+Mp3Info = namedtuple('Mp3Info', ['duration', 'bitrate', 'sample_rate', 'frames'])
+
+# kbps, indexed by [version key][layer][bitrate index]
+BITRATES = {
+    'v1': {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    'v2': {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+# Hz, indexed by version bits (0: MPEG-2.5, 2: MPEG-2, 3: MPEG-1)
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+Frame = namedtuple('Frame', ['version', 'layer', 'bitrate', 'sample_rate', 'samples', 'size', 'mono'])
+
+
+def parse_frame_header(header):
+    """
+    Parse 4 header bytes, returns a Frame or None if they are not a valid
+    MPEG audio frame header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    mono = (header[3] >> 6) == 0x03
+
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = BITRATES['v1' if version == 3 else 'v2'][layer][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+
+    if layer == 1:
+        samples = 384
+        size = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 3:
+        samples = 1152
+        size = 144 * bitrate // sample_rate + padding
+    else:
+        #MPEG-2/2.5 layer III frames carry half the samples
+        samples = 576
+        size = 72 * bitrate // sample_rate + padding
+
+    return Frame(version, layer, bitrate, sample_rate, samples, size, mono)
+
+def id3v2_size(data):
+    #total size of a leading ID3v2 tag, 0 if there is none
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (
+        (data[6] & 0x7F) << 21
+        | (data[7] & 0x7F) << 14
+        | (data[8] & 0x7F) << 7
+        | (data[9] & 0x7F)
+    )
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _side_info_size(frame):
+    if frame.version == 3:
+        return 17 if frame.mono else 32
+    return 9 if frame.mono else 17
+
+def summary_frame_count(frame, data):
+    """
+    Frame count stored in a Xing/Info or VBRI header inside the first
+    frame, or None if the frame is ordinary audio.
+    """
+    if frame.layer != 3:
+        return None
+
+    offset = 4 + _side_info_size(frame)
+    tag = data[offset:offset + 4]
+    if tag in (b"Xing", b"Info"):
+        flags = int.from_bytes(data[offset + 4:offset + 8], "big")
+        if flags & 0x01:
+            return int.from_bytes(data[offset + 8:offset + 12], "big")
+        return None
+
+    if data[36:40] == b"VBRI":
+        return int.from_bytes(data[50:54], "big")
+    return None
+
+def is_summary_frame(frame, data):
+    offset = 4 + _side_info_size(frame)
+    return data[offset:offset + 4] in (b"Xing", b"Info") or data[36:40] == b"VBRI"
+
+def strip_tags(data):
+    """
+    Drop ID3v2/ID3v1 tags and a leading Xing/Info/VBRI frame so streams can
+    be concatenated without the first stream's summary describing the whole.
+    """
+    data = data[id3v2_size(data):]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+
+    frame = parse_frame_header(data[:4])
+    if frame and frame.size and is_summary_frame(frame, data[:frame.size]):
+        data = data[frame.size:]
+    return data
+
+def probe(fp):
+    """
+    Read frame headers of an open binary file and return Mp3Info, or None
+    if no MPEG audio frame was found. Only 4 bytes per frame are read.
+    """
+    fp.seek(0, 2)
+    file_size = fp.tell()
+    fp.seek(0)
+
+    position = id3v2_size(fp.read(10))
+    fp.seek(position)
+
+    first = None
+    frames = 0
+    samples = 0
+    audio_bytes = 0
+
+    while position + 4 <= file_size:
+        fp.seek(position)
+        header = fp.read(4)
+        frame = parse_frame_header(header)
+
+        if frame is None or frame.size < 4:
+            if header[:3] == b"TAG":
+                break
+            #lost sync, try the next byte
+            position += 1
+            continue
+
+        if first is None:
+            first = frame
+            fp.seek(position)
+            count = summary_frame_count(frame, fp.read(min(frame.size, 200)))
+            if count:
+                duration = count * frame.samples / frame.sample_rate
+                audio_bytes = file_size - position - frame.size
+                bitrate = int(audio_bytes * 8 / duration) if duration else frame.bitrate
+                return Mp3Info(duration, bitrate, frame.sample_rate, count)
+
+        frames += 1
+        samples += frame.samples
+        audio_bytes += frame.size
+        position += frame.size
+
+    if first is None:
+        return None
+
+    duration = samples / first.sample_rate
+    bitrate = int(audio_bytes * 8 / duration) if duration else first.bitrate
+    return Mp3Info(duration, bitrate, first.sample_rate, frames)
+
+def probe_file(field_file):
+    #works with any storage that returns seekable files
+    with field_file.storage.open(field_file.name, "rb") as fp:
+        return probe(fp)
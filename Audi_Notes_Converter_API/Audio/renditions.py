@@ -0,0 +1,208 @@
+"""
+Compact re-encodings of generated audio (settings.AUDIO_RENDITIONS).
+The first request for a rendition queues it, once per blob and profile;
+a worker transcodes it with ffmpeg and stores it next to the shared blob,
+so later downloads are plain file reads.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AudioRendition
+
+logger = logging.getLogger("audio")
+
+# what the generated audio itself is served as
+ORIGINAL_CONTENT_TYPE = "audio/mpeg"
+# seconds a client is asked to wait before asking for a queued rendition again
+RETRY_AFTER = 5
+
+
+class RenditionError(Exception):
+    """
+    Raised when a rendition could not be transcoded
+    """
+
+
+# Profile selection
+def _accepted_types(accept):
+    #Accept header -> {media type: q}
+    accepted = {}
+    for item in accept.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[parts[0].lower()] = q
+    return accepted
+
+def select_profile(request):
+    """
+    Rendition profile asked for by ?profile=, or else the one whose
+    content type the Accept header prefers over the original MP3.
+    Returns None for the original. Raises KeyError for an unknown profile.
+    """
+    profile = request.query_params.get("profile")
+    if profile:
+        if profile != "original" and profile not in settings.AUDIO_RENDITIONS:
+            raise KeyError(profile)
+        return None if profile == "original" else profile
+
+    accepted = _accepted_types(request.META.get("HTTP_ACCEPT", ""))
+    if not accepted:
+        return None
+
+    def quality(content_type):
+        major = content_type.split("/")[0]
+        return accepted.get(content_type, accepted.get(f"{major}/*", accepted.get("*/*", 0.0)))
+
+    best, best_q = None, quality(ORIGINAL_CONTENT_TYPE)
+    for name, config in settings.AUDIO_RENDITIONS.items():
+        #only an explicit mention beats the original, wildcards keep the MP3
+        q = accepted.get(config["CONTENT_TYPE"], 0.0)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+# Transcoding
+def transcode(source_path, output_path, profile):
+    config = settings.AUDIO_RENDITIONS[profile]
+    command = [
+        settings.FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-y", "-i", source_path, "-vn", *config["FFMPEG_ARGS"], output_path,
+    ]
+    try:
+        subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            timeout=settings.AUDIO_RENDITION_TIMEOUT,
+        )
+    except FileNotFoundError:
+        raise RenditionError(f"Encoder not found: {settings.FFMPEG_BINARY}")
+    except subprocess.TimeoutExpired:
+        raise RenditionError(f"Transcoding to {profile} timed out")
+    except subprocess.CalledProcessError as e:
+        raise RenditionError(
+            f"Transcoding to {profile} failed: {e.stderr.decode(errors='replace').strip()}"
+        )
+
+def _local_source(field_file, workdir):
+    #ffmpeg needs a path, copy out of storages that have none
+    try:
+        return field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        path = os.path.join(workdir, "source.mp3")
+        with field_file.storage.open(field_file.name, "rb") as src, open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        return path
+
+def request_rendition(blob, profile):
+    """
+    Return the rendition of `blob` if it is ready to serve. Otherwise make
+    sure it is queued for the workers and return None; the unique
+    (blob, profile) row keeps concurrent requests from queueing it twice.
+    Raises RenditionError if transcoding failed.
+    """
+    rendition, _ = AudioRendition.objects.get_or_create(blob=blob, profile=profile)
+
+    if rendition.status == AudioRendition.STATUS_READY:
+        if rendition.audio_file.storage.exists(rendition.audio_file.name):
+            return rendition
+        #the row survived its file, transcode again
+        _requeue(rendition, AudioRendition.STATUS_READY)
+        return None
+
+    if rendition.status == AudioRendition.STATUS_FAILED:
+        #try again now and then, the encoder may have been fixed meanwhile
+        retry_at = (rendition.claimed_at or rendition.created_at) + timedelta(seconds=settings.AUDIO_RENDITION_TIMEOUT)
+        if timezone.now() >= retry_at:
+            _requeue(rendition, AudioRendition.STATUS_FAILED)
+        raise RenditionError(rendition.error or f"Transcoding to {profile} failed")
+
+    return None
+
+def _requeue(rendition, current_status):
+    #only one request moves it back, the others see it pending
+    AudioRendition.objects.filter(pk=rendition.pk, status=current_status).update(
+        status=AudioRendition.STATUS_PENDING
+    )
+
+
+# Background transcoding
+def claim_next_rendition():
+    #a rendition still processing well past the ffmpeg timeout lost its worker
+    stuck = timezone.now() - timedelta(seconds=2 * settings.AUDIO_RENDITION_TIMEOUT)
+    with transaction.atomic():
+        rendition = (
+            AudioRendition.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('blob')
+            .filter(
+                Q(status=AudioRendition.STATUS_PENDING)
+                | Q(status=AudioRendition.STATUS_PROCESSING, claimed_at__lt=stuck)
+            )
+            .order_by('id')
+            .first()
+        )
+        if rendition is None:
+            return None
+
+        rendition.status = AudioRendition.STATUS_PROCESSING
+        rendition.claimed_at = timezone.now()
+        rendition.save(update_fields=['status', 'claimed_at'])
+
+    return rendition
+
+def transcode_rendition(rendition):
+    blob = rendition.blob
+    profile = rendition.profile
+    config = settings.AUDIO_RENDITIONS[profile]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        output_path = os.path.join(workdir, f"output.{config['EXTENSION']}")
+        transcode(_local_source(blob.audio_file, workdir), output_path, profile)
+        with open(output_path, "rb") as f:
+            rendition.audio_file.save(f"{profile}.{config['EXTENSION']}", File(f), save=False)
+        rendition.file_size = os.path.getsize(output_path)
+
+    rendition.status = AudioRendition.STATUS_READY
+    rendition.error = ''
+    rendition.save(update_fields=['audio_file', 'file_size', 'status', 'error'])
+
+    logger.info(
+        "Audio blob %s: %s rendition %s bytes (source %s bytes)",
+        blob.content_hash, profile, rendition.file_size, blob.file_size,
+    )
+    return rendition
+
+def run_next_rendition():
+    #returns False when nothing was queued
+    rendition = claim_next_rendition()
+    if rendition is None:
+        return False
+
+    try:
+        transcode_rendition(rendition)
+    except Exception as e:
+        logger.error("Rendition %s of audio blob %s failed: %s", rendition.profile, rendition.blob.content_hash, e)
+        rendition.status = AudioRendition.STATUS_FAILED
+        rendition.error = str(e)
+        rendition.save(update_fields=['status', 'error'])
+    return True
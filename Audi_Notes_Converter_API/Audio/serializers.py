@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import AudioFile
+from .models import AudioFile, AudioGenerationJob
 from Document.models import Document
 
 
@@ -28,12 +29,43 @@ class AudioFileSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+class AudioGenerationJobSerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for queued/running/finished generation jobs
+    """
+    job_id = serializers.IntegerField(source="id", read_only=True)
+    document_id = serializers.IntegerField(
+        source="document.id",
+        read_only=True
+    )
+
+    class Meta:
+        model = AudioGenerationJob
+        fields = [
+            "job_id",
+            "document_id",
+            "status",
+            "progress",
+            "error",
+            "stats",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
 class AudioGenerateSerializer(serializers.Serializer):
     """
     Serializer for generating audio
     """
     document_id = serializers.IntegerField(read_only=True)
     message = serializers.CharField(read_only=True)
+    # re-synthesize existing audio, unchanged chunks are reused
+    regenerate = serializers.BooleanField(
+        required=False,
+        default=False,
+        write_only=True
+    )
 
     def validate(self, attrs):
         request = self.context.get("request")
@@ -56,3 +88,49 @@ class AudioGenerateSerializer(serializers.Serializer):
 
         attrs["document"] = document
         return attrs
+
+class AudioBatchGenerateSerializer(serializers.Serializer):
+    """
+    Serializer for generating audio for many documents at once
+    """
+    document_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.AUDIO_BATCH_MAX_DOCUMENTS,
+    )
+    regenerate = serializers.BooleanField(required=False, default=False)
+
+    def validate_document_ids(self, value):
+        # drop duplicates, keep the requested order
+        return list(dict.fromkeys(value))
+
+    def validate(self, attrs):
+        request = self.context.get("request")
+        document_ids = attrs["document_ids"]
+
+        # Same checks as AudioGenerateSerializer, in a single query
+        documents = {
+            document.id: document
+            for document in Document.objects.filter(id__in=document_ids)
+        }
+
+        missing = [i for i in document_ids if i not in documents]
+        if missing:
+            raise serializers.ValidationError(
+                f"Documents not found: {missing}"
+            )
+
+        not_owned = [i for i in document_ids if documents[i].user_id != request.user.id]
+        if not_owned:
+            raise serializers.ValidationError(
+                f"You do not have permission to generate audio for documents: {not_owned}"
+            )
+
+        no_file = [i for i in document_ids if not documents[i].file]
+        if no_file:
+            raise serializers.ValidationError(
+                f"Documents have no file attached: {no_file}"
+            )
+
+        attrs["documents"] = [documents[i] for i in document_ids]
+        return attrs
@@ -0,0 +1,184 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+
+from .backends import get_backend
+from .cache import (
+    attach_blob,
+    audio_cache_key,
+    find_blob,
+    find_segments,
+    iter_paragraphs,
+    paragraphs_cache_key,
+    read_segment,
+    store_blob,
+    store_segment,
+)
+from .models import AudioFile
+from .mp3 import probe, strip_tags
+from .tts import iter_chunks, synthesize, synthesize_stream
+from Document.extraction import TextExtractionError, get_document_text
+from Document.models import PendingFileDeletion
+
+logger = logging.getLogger("audio")
+
+# chunks whose cached segments are looked up in one query
+SEGMENT_LOOKUP_BATCH = 64
+
+
+class AudioGenerationError(Exception):
+    """
+    Raised when a document cannot be converted to audio (not worth retrying)
+    """
+
+
+# Audio generation
+def _release_own_file(audio, previous_name):
+    #legacy per-document file replaced by a shared blob
+    if previous_name and previous_name != audio.audio_file.name:
+        PendingFileDeletion.schedule(previous_name)
+
+def _resolve_segments(chunks, lang, voice, known):
+    """
+    Pair each chunk with its cached AudioSegment (or None), looking
+    segments up a window of chunks at a time.
+    """
+    window = []
+
+    def resolve():
+        keys = [audio_cache_key(chunk, lang, voice) for chunk in window]
+        found = find_segments([key for key in keys if key not in known])
+        for chunk, key in zip(window, keys):
+            yield chunk, known.get(key) or found.get(key)
+
+    for chunk in chunks:
+        window.append(chunk)
+        if len(window) >= SEGMENT_LOOKUP_BATCH:
+            yield from resolve()
+            window = []
+    if window:
+        yield from resolve()
+
+def generate_audio(document, progress=None):
+    """
+    Extract the document text, synthesize it chunk by chunk and store the
+    resulting mp3. `progress` is an optional callable receiving a percentage.
+    Identical text reuses the cached audio instead of being synthesized again.
+    Returns the AudioFile and a report with per-chunk timings.
+
+    Paragraphs, chunks and audio flow through generators: at most
+    AUDIO_TTS_MAX_PENDING chunks of audio are in memory at once, each is
+    appended to a temporary file as soon as it is next in order.
+    """
+    report = progress or (lambda percent: None)
+    lang = settings.AUDIO_TTS_LANGUAGE
+
+    #stored at upload time, re-parsed only if the file changed
+    try:
+        extracted = get_document_text(document)
+    except TextExtractionError as e:
+        raise AudioGenerationError(f"Could not read document: {e}")
+
+    source = extracted.text
+    voice = get_backend().voice
+
+    #first pass: cache key and chunk count, nothing is kept
+    document_key = paragraphs_cache_key(iter_paragraphs(source), lang, voice)
+    total = sum(1 for _ in iter_chunks(iter_paragraphs(source)))
+    if not total:
+        raise AudioGenerationError("No readable text found in document")
+    report(10)
+
+    audio = AudioFile.objects.filter(document=document).first()
+    if audio is None:
+        audio = AudioFile(document=document)
+    own_file = None if audio.blob_id else (audio.audio_file.name or None)
+
+    blob = find_blob(document_key)
+    if blob is not None and attach_blob(audio, blob):
+        _release_own_file(audio, own_file)
+        logger.info("Document %s: audio cache hit %s", document.id, document_key)
+        return audio, {
+            "cache_hit": True,
+            "chunks": 0,
+            "synthesis_seconds": 0,
+            "chunk_timings": [],
+        }
+
+    #second pass: per-chunk audio from earlier generations is reused,
+    #only changed chunks are synthesized again
+    known = {}
+    items = _resolve_segments(iter_chunks(iter_paragraphs(source)), lang, voice, known)
+    timings = []
+    reused = 0
+    size = 0
+
+    started = time.perf_counter()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
+        temp_audio_path = temp_audio.name
+        try:
+            for done, (chunk, segment, data, timing) in enumerate(synthesize_stream(items, lang), start=1):
+                key = audio_cache_key(chunk, lang, voice)
+                if data is None:
+                    try:
+                        data = read_segment(segment)
+                        reused += 1
+                    except OSError:
+                        #segment file went missing, synthesize it again
+                        data = synthesize(chunk, lang)
+                        known[key] = store_segment(key, data)
+                else:
+                    timings.append(timing)
+                    known[key] = store_segment(key, data)
+
+                #MPEG frames are self-contained, tag-less streams concatenate
+                part = strip_tags(data)
+                temp_audio.write(part)
+                size += len(part)
+                del data, part
+
+                #synthesis accounts for 10% -> 90% of the job
+                report(10 + int(80 * done / total))
+        except BaseException:
+            temp_audio.close()
+            os.remove(temp_audio_path)
+            raise
+    synthesis_seconds = round(time.perf_counter() - started, 3)
+
+    try:
+        with open(temp_audio_path, "rb") as f:
+            #frame headers only, no decoding
+            info = probe(f)
+            duration = round(info.duration) if info else None
+            f.seek(0)
+            #copied to storage in blocks
+            blob = store_blob(document_key, File(f), size, duration)
+    finally:
+        os.remove(temp_audio_path)
+
+    if not attach_blob(audio, blob):
+        raise RuntimeError(f"Audio blob {document_key} was released while attaching")
+    _release_own_file(audio, own_file)
+
+    logger.info(
+        "Document %s: %s chunks, %s reused, %s synthesized in %ss (sum of chunk times %ss)",
+        document.id,
+        total,
+        reused,
+        total - reused,
+        synthesis_seconds,
+        round(sum(t["seconds"] for t in timings), 3),
+    )
+
+    return audio, {
+        "cache_hit": False,
+        "chunks": total,
+        "segments_reused": reused,
+        "segments_synthesized": total - reused,
+        "synthesis_seconds": synthesis_seconds,
+        "chunk_timings": timings,
+    }
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import AudioFile, AudioSegment
+from Document.models import PendingFileDeletion
+
+
+@receiver(post_delete, sender=AudioFile)
+def release_audio_file(sender, instance, **kwargs):
+    #also runs for cascades (deleting a Document) which skip AudioFile.delete()
+    if instance.blob_id:
+        instance.blob.release()
+    elif instance.audio_file:
+        PendingFileDeletion.schedule(instance.audio_file.name)
+
+@receiver(post_delete, sender=AudioSegment)
+def delete_segment_file(sender, instance, **kwargs):
+    PendingFileDeletion.schedule(instance.audio_file.name)
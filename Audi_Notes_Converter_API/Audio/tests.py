@@ -1,3 +1,486 @@
-from django.test import TestCase
+import io
+import shutil
+import signal
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from . import jobs, renditions, services, tts
+from .backends import SyntheticTTSBackend, get_backend
+from .cache import audio_cache_key, iter_paragraphs, paragraphs_cache_key, read_segment, store_blob, store_segment
+from .models import AudioBlob, AudioFile, AudioGenerationJob, AudioRendition, AudioSegment
+from .mp3 import probe
+from .renditions import RenditionError, request_rendition, run_next_rendition
+
+from Document.models import Document
 
 # Create your tests here.
+#activity logs written in the test's transaction, not by the writer thread
+SYNC_ACTIVITY_LOG = override_settings(ACTIVITY_LOG_WRITER={**settings.ACTIVITY_LOG_WRITER, 'ENABLED': False})
+
+
+class TempMediaMixin:
+    #stored files go to a throwaway MEDIA_ROOT
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class CacheKeyTests(TestCase):
+    def key(self, text, voice="gtts"):
+        return paragraphs_cache_key(iter_paragraphs(text), "en", voice)
+
+    def test_whitespace_does_not_change_the_key(self):
+        self.assertEqual(
+            self.key("First  line\nstill first.\n\n\n  Second paragraph "),
+            self.key("First line still first.\n\nSecond paragraph"),
+        )
+
+    def test_key_matches_the_joined_text_key(self):
+        text = "One.\n\nTwo."
+        self.assertEqual(self.key(text), audio_cache_key("One.\n\nTwo.", "en", "gtts"))
+
+    def test_voice_is_part_of_the_key(self):
+        self.assertNotEqual(self.key("One.", "gtts"), self.key("One.", "synthetic"))
+
+
+class StoreBlobTests(TempMediaMixin, TestCase):
+    key = "ab" * 32
+
+    def test_existing_blob_is_reused_and_duplicate_file_removed(self):
+        first = store_blob(self.key, ContentFile(b"audio"), 5)
+        second = store_blob(self.key, ContentFile(b"audio"), 5)
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(AudioBlob.objects.count(), 1)
+        storage = second.audio_file.storage
+        self.assertTrue(storage.exists(second.audio_file.name))
+        self.assertEqual(storage.listdir(f"audio/cache/{self.key[:2]}")[1], [f"{self.key}.mp3"])
+
+    def test_blob_with_missing_file_is_repaired(self):
+        blob = store_blob(self.key, ContentFile(b"audio"), 5)
+        blob.audio_file.storage.delete(blob.audio_file.name)
+
+        repaired = store_blob(self.key, ContentFile(b"audio"), 5)
+
+        self.assertEqual(repaired.pk, blob.pk)
+        repaired.refresh_from_db()
+        with repaired.audio_file.storage.open(repaired.audio_file.name, "rb") as f:
+            self.assertEqual(f.read(), b"audio")
+
+
+class StoreSegmentTests(TempMediaMixin, TestCase):
+    key = "cd" * 32
+
+    def test_segment_with_missing_file_is_repaired(self):
+        segment = store_segment(self.key, b"chunk")
+        segment.audio_file.storage.delete(segment.audio_file.name)
+
+        repaired = store_segment(self.key, b"chunk")
+
+        self.assertEqual(AudioSegment.objects.count(), 1)
+        repaired.refresh_from_db()
+        self.assertEqual(read_segment(repaired), b"chunk")
+
+
+class StopWorker(Exception):
+    pass
+
+
+@SYNC_ACTIVITY_LOG
+class RunWorkerTests(TestCase):
+    def setUp(self):
+        #run_worker installs a SIGTERM handler and ignores SIGTERM on exit
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+        self.user = get_user_model().objects.create_user(username="reader")
+        self.document = Document.objects.create(
+            user=self.user, title="Notes", file_type="pdf", file_size=0
+        )
+
+    def test_failed_iteration_is_logged_and_the_worker_keeps_polling(self):
+        with mock.patch.object(jobs, "_work_once", side_effect=[DatabaseError("gone"), True, False]) as work, \
+                mock.patch.object(jobs.time, "sleep", side_effect=[None, StopWorker]), \
+                self.assertLogs("audio", level="ERROR"):
+            with self.assertRaises(StopWorker):
+                jobs.run_worker(poll_interval=1)
+
+        self.assertEqual(work.call_count, 3)
+
+    def test_stale_jobs_are_requeued_by_the_worker(self):
+        job = AudioGenerationJob.objects.create(
+            document=self.document,
+            user=self.user,
+            in_flight=self.document.id,
+            status=AudioGenerationJob.STATUS_RUNNING,
+            attempts=1,
+            worker="crashed:1",
+            started_at=timezone.now() - timedelta(hours=2),
+        )
+
+        with mock.patch.object(jobs, "run_job") as run_job, \
+                mock.patch.object(jobs, "run_next_extraction", return_value=False), \
+                mock.patch.object(jobs, "purge_pending_deletions", return_value=0), \
+                self.assertLogs("audio", level="WARNING"):
+            jobs.run_worker(once=True)
+
+        run_job.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, AudioGenerationJob.STATUS_RUNNING)
+        self.assertEqual(job.attempts, 2)
+        self.assertNotEqual(job.worker, "crashed:1")
+
+
+def fake_transcode(source_path, output_path, profile):
+    with open(output_path, "wb") as f:
+        f.write(b"small")
+
+
+@SYNC_ACTIVITY_LOG
+class RenditionTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.blob = store_blob("ef" * 32, ContentFile(b"original audio"), 14)
+
+    def test_rendition_is_queued_once_and_transcoded_by_a_worker(self):
+        self.assertIsNone(request_rendition(self.blob, "speech"))
+        self.assertIsNone(request_rendition(self.blob, "speech"))
+        self.assertEqual(AudioRendition.objects.filter(status=AudioRendition.STATUS_PENDING).count(), 1)
+
+        with mock.patch.object(renditions, "transcode", side_effect=fake_transcode):
+            self.assertTrue(run_next_rendition())
+            self.assertFalse(run_next_rendition())
+
+        rendition = request_rendition(self.blob, "speech")
+        self.assertEqual(rendition.status, AudioRendition.STATUS_READY)
+        self.assertEqual(rendition.file_size, 5)
+        self.assertTrue(rendition.audio_file.name.endswith(".speech.mp3"))
+
+    def test_failed_rendition_is_reported(self):
+        request_rendition(self.blob, "opus")
+        with mock.patch.object(renditions, "transcode", side_effect=RenditionError("Encoder not found: ffmpeg")):
+            run_next_rendition()
+
+        with self.assertRaisesMessage(RenditionError, "Encoder not found"):
+            request_rendition(self.blob, "opus")
+
+    def test_download_waits_for_a_named_profile_and_plays_the_original_for_accept(self):
+        user = get_user_model().objects.create_user(username="listener")
+        document = Document.objects.create(user=user, title="Notes", file_type="pdf", file_size=0)
+        AudioFile.objects.create(
+            document=document, audio_file=self.blob.audio_file.name, file_size=14, blob=self.blob
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        url = reverse("audio-download", args=[document.id])
+
+        response = client.get(url, {"profile": "speech"})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn("Retry-After", response)
+
+        response = client.get(url, HTTP_ACCEPT="audio/ogg")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"original audio")
+        self.assertEqual(AudioRendition.objects.count(), 2)
+
+
+class ChunkingTests(SimpleTestCase):
+    def test_chunks_keep_sentences_whole_and_stay_within_paragraphs(self):
+        chunks = list(tts.iter_chunks(
+            ["One two. Three four. Five six.", "Next paragraph."],
+            max_chars=20,
+        ))
+
+        self.assertEqual(chunks, ["One two. Three four.", "Five six.", "Next paragraph."])
+        self.assertTrue(all(len(chunk) <= 20 for chunk in chunks))
+
+    def test_sentence_longer_than_a_chunk_is_split_on_words(self):
+        chunks = tts.split_text("alpha beta gamma delta epsilon", max_chars=12)
+
+        self.assertEqual(chunks, ["alpha beta", "gamma delta", "epsilon"])
+
+    def test_stream_yields_in_input_order_whatever_finishes_first(self):
+        def slow_first(text, lang):
+            #the first chunk finishes last
+            time.sleep(0.05 if text == "first" else 0)
+            return text.encode()
+
+        items = [("first", None), ("cached", b"kept"), ("third", None)]
+        with mock.patch.object(tts, "synthesize", side_effect=slow_first):
+            results = list(tts.synthesize_stream(iter(items), "en", max_workers=3, max_pending=3))
+
+        self.assertEqual(
+            [(text, cached, data) for text, cached, data, _ in results],
+            [("first", None, b"first"), ("cached", b"kept", None), ("third", None, b"third")],
+        )
+        self.assertEqual([timing["index"] for _, _, _, timing in results if timing], [0, 2])
+
+    def test_stream_reads_ahead_at_most_max_pending_items(self):
+        consumed = []
+
+        def items():
+            for index in range(10):
+                consumed.append(index)
+                yield f"chunk {index}", None
+
+        with mock.patch.object(tts, "synthesize", return_value=b"mp3"):
+            stream = tts.synthesize_stream(items(), "en", max_workers=2, max_pending=2)
+            next(stream)
+            self.assertEqual(len(consumed), 2)
+            next(stream)
+            self.assertEqual(len(consumed), 3)
+            stream.close()
+
+    def test_concatenation_drops_tags_between_parts(self):
+        frame = b"\xff\xfb\x18\xc0" + bytes(140)
+        tagged = b"ID3\x03\x00\x00\x00\x00\x00\x04" + b"TIT2" + frame
+
+        buffer = io.BytesIO()
+        size = tts.concatenate_mp3([tagged, frame], buffer)
+
+        self.assertEqual(buffer.getvalue(), frame * 2)
+        self.assertEqual(size, len(frame) * 2)
+
+
+class BackendTests(SimpleTestCase):
+    def setUp(self):
+        #the configured backend is built once per process
+        get_backend.cache_clear()
+        self.addCleanup(get_backend.cache_clear)
+
+    @override_settings(AUDIO_TTS_BACKEND={"BACKEND": "synthetic", "OPTIONS": {"words_per_minute": 120}})
+    def test_short_name_selects_the_backend_with_its_options(self):
+        backend = get_backend()
+
+        self.assertIsInstance(backend, SyntheticTTSBackend)
+        self.assertEqual(backend.voice, "synthetic:120wpm")
+        self.assertIs(get_backend(), backend)
+
+    @override_settings(AUDIO_TTS_BACKEND={"BACKEND": "Audio.backends.SyntheticTTSBackend"})
+    def test_dotted_path_selects_the_backend(self):
+        self.assertIsInstance(get_backend(), SyntheticTTSBackend)
+
+    def test_synthetic_audio_length_follows_the_word_count(self):
+        backend = SyntheticTTSBackend(words_per_minute=60)
+
+        data = backend.synthesize(" ".join(["word"] * 3), "en")
+
+        self.assertEqual(data, backend.synthesize("other words here", "en"))
+        self.assertEqual(len(data) % backend.FRAME_SIZE, 0)
+        self.assertAlmostEqual(len(data) // backend.FRAME_SIZE * backend.FRAME_SECONDS, 3, delta=0.05)
+
+
+#one frame per word, instantly
+SYNTHETIC_TTS = override_settings(
+    AUDIO_TTS_BACKEND={"BACKEND": "synthetic", "OPTIONS": {"words_per_minute": 1667}},
+    AUDIO_TTS_CHUNK_CHARS=40,
+)
+
+
+@SYNTHETIC_TTS
+@SYNC_ACTIVITY_LOG
+class GenerateAudioTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_backend.cache_clear()
+        self.addCleanup(get_backend.cache_clear)
+        user = get_user_model().objects.create_user(username="reader")
+        self.document = Document.objects.create(user=user, title="Notes", file_type="pdf", file_size=0)
+
+    def generate(self, text):
+        extracted = SimpleNamespace(text=text)
+        with mock.patch.object(services, "get_document_text", return_value=extracted), \
+                mock.patch.object(tts, "synthesize", wraps=tts.synthesize) as synthesize:
+            audio, stats = services.generate_audio(self.document)
+        return audio, stats, [c.args[0] for c in synthesize.call_args_list]
+
+    def test_only_changed_paragraphs_are_synthesized_again(self):
+        _, first, synthesized = self.generate("First paragraph.\n\nSecond paragraph.\n\nThird one.")
+        self.assertEqual(first["segments_synthesized"], 3)
+        self.assertEqual(len(synthesized), 3)
+
+        _, second, synthesized = self.generate("First paragraph.\n\nSecond, edited.\n\nThird one.")
+        self.assertEqual(second["segments_reused"], 2)
+        self.assertEqual(synthesized, ["Second, edited."])
+        self.assertEqual(AudioSegment.objects.count(), 4)
+
+    def test_audio_is_the_chunks_in_order_with_its_duration(self):
+        audio, stats, _ = self.generate("One two three.\n\nFour five.")
+
+        backend = get_backend()
+        expected = backend.synthesize("One two three.", "en") + backend.synthesize("Four five.", "en")
+        with audio.audio_file.storage.open(audio.audio_file.name, "rb") as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(audio.file_size, len(expected))
+        self.assertEqual(audio.duration, round(probe(io.BytesIO(expected)).duration))
+        self.assertEqual(stats["chunks"], 2)
+
+    def test_identical_text_reuses_the_stored_audio(self):
+        audio, _, _ = self.generate("Some text.")
+        again, stats, synthesized = self.generate("Some  text.\n\n")
+
+        self.assertTrue(stats["cache_hit"])
+        self.assertEqual(synthesized, [])
+        self.assertEqual(again.blob_id, audio.blob_id)
+
+
+class Mp3ProbeTests(SimpleTestCase):
+    #MPEG-1 Layer III, 32 kbps, 32 kHz, mono: 144 byte frames of 1152 samples
+    frame = SyntheticTTSBackend.FRAME_HEADER + bytes(140)
+
+    def test_duration_and_bitrate_come_from_frame_headers(self):
+        info = probe(io.BytesIO(self.frame * 250))
+
+        self.assertAlmostEqual(info.duration, 9.0)
+        self.assertEqual(info.bitrate, 32000)
+        self.assertEqual(info.sample_rate, 32000)
+        self.assertEqual(info.frames, 250)
+
+    def test_tags_are_skipped(self):
+        id3v2 = b"ID3\x03\x00\x00\x00\x00\x00\x05" + b"TIT2\x00"
+        id3v1 = b"TAG" + bytes(125)
+
+        info = probe(io.BytesIO(id3v2 + self.frame * 10 + id3v1))
+
+        self.assertEqual(info.frames, 10)
+
+    def test_xing_frame_count_is_used_without_scanning(self):
+        #side info of a mono MPEG-1 frame is 17 bytes
+        xing = bytearray(self.frame)
+        xing[21:33] = b"Xing" + (1).to_bytes(4, "big") + (1000).to_bytes(4, "big")
+
+        info = probe(io.BytesIO(bytes(xing) + self.frame * 3))
+
+        self.assertEqual(info.frames, 1000)
+        self.assertAlmostEqual(info.duration, 36.0)
+
+    def test_non_mp3_data_has_no_info(self):
+        self.assertIsNone(probe(io.BytesIO(b"not audio at all" * 10)))
+
+
+class BackfillDurationTests(TempMediaMixin, TestCase):
+    def test_missing_durations_are_filled_in(self):
+        blob = store_blob("12" * 32, ContentFile(Mp3ProbeTests.frame * 250), 144 * 250)
+        AudioBlob.objects.filter(pk=blob.pk).update(duration=None)
+
+        call_command("backfill_audio_duration", stdout=io.StringIO())
+
+        blob.refresh_from_db()
+        self.assertEqual(blob.duration, 9)
+
+
+class JobQueueMixin:
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice")
+        self.bob = User.objects.create_user(username="bob")
+
+    def document(self, user):
+        return Document.objects.create(
+            user=user, title="Notes", file="documents/notes.pdf", file_type="pdf", file_size=0
+        )
+
+
+@SYNC_ACTIVITY_LOG
+class FairClaimTests(JobQueueMixin, TestCase):
+    def test_users_take_turns_whatever_their_queue_depth(self):
+        for _ in range(3):
+            jobs.enqueue_generation(self.document(self.alice), self.alice)
+        jobs.enqueue_generation(self.document(self.bob), self.bob)
+
+        claimed = [jobs.claim_next_job("test").user for _ in range(3)]
+
+        self.assertEqual(claimed, [self.alice, self.bob, self.alice])
+
+    @override_settings(AUDIO_MAX_CONCURRENT_JOBS=2)
+    def test_no_job_is_claimed_beyond_the_concurrency_limit(self):
+        for _ in range(3):
+            jobs.enqueue_generation(self.document(self.alice), self.alice)
+
+        self.assertIsNotNone(jobs.claim_next_job("test"))
+        self.assertIsNotNone(jobs.claim_next_job("test"))
+        self.assertIsNone(jobs.claim_next_job("test"))
+
+        running = AudioGenerationJob.objects.filter(status=AudioGenerationJob.STATUS_RUNNING).first()
+        jobs._finish(running, AudioGenerationJob.STATUS_DONE)
+        self.assertIsNotNone(jobs.claim_next_job("test"))
+
+    def test_batch_endpoint_queues_one_job_per_document(self):
+        documents = [self.document(self.alice) for _ in range(3)]
+        client = APIClient()
+        client.force_authenticate(self.alice)
+
+        response = client.post(
+            reverse("audio-batch-generate"),
+            {"document_ids": [d.id for d in documents] + [documents[0].id]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["queued"], [d.id for d in documents])
+        status_response = client.get(reverse("audio-batch-status", args=[response.data["batch_id"]]))
+        self.assertEqual(status_response.data["counts"]["queued"], 3)
+
+
+@SYNC_ACTIVITY_LOG
+class SingleFlightTests(JobQueueMixin, TestCase):
+    def test_repeated_requests_attach_to_the_job_in_flight(self):
+        document = self.document(self.alice)
+
+        job, created = jobs.enqueue_generation(document, self.alice)
+        again, created_again = jobs.enqueue_generation(document, self.alice)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.pk, job.pk)
+
+    def test_a_finished_job_lets_the_document_be_queued_again(self):
+        document = self.document(self.alice)
+        job, _ = jobs.enqueue_generation(document, self.alice)
+        jobs._finish(job, AudioGenerationJob.STATUS_FAILED, "boom")
+
+        retry, created = jobs.enqueue_generation(document, self.alice)
+
+        self.assertTrue(created)
+        self.assertNotEqual(retry.pk, job.pk)
+
+    def test_batch_attaches_documents_already_in_flight(self):
+        busy, idle = self.document(self.alice), self.document(self.alice)
+        job, _ = jobs.enqueue_generation(busy, self.alice)
+
+        batch, in_flight = jobs.enqueue_batch([busy, idle], self.alice)
+
+        self.assertEqual(in_flight, {busy.id: job.id})
+        self.assertEqual(AudioGenerationJob.objects.filter(document=busy).count(), 1)
+        self.assertTrue(AudioGenerationJob.objects.filter(document=idle, batch=batch).exists())
+
+    def test_generate_endpoint_reports_the_job_in_progress(self):
+        document = self.document(self.alice)
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = reverse("audio-generate", args=[document.id])
+
+        first = client.post(url, {}, format="json")
+        second = client.post(url, {}, format="json")
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data["job_id"], first.data["job_id"])
+        self.assertEqual(second.data["message"], "Audio generation already in progress")
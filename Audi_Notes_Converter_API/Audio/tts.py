@@ -0,0 +1,161 @@
+import logging
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .backends import get_backend
+from .mp3 import strip_tags
+
+logger = logging.getLogger("audio")
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+# Chunking
+def _split_long_sentence(sentence, max_chars):
+    #fall back to word boundaries for sentences longer than a chunk
+    words = sentence.split()
+    current = ""
+    for word in words:
+        if current and len(current) + len(word) + 1 > max_chars:
+            yield current
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        yield current
+
+def iter_chunks(paragraphs, max_chars=None):
+    """
+    Yield chunks of at most `max_chars` from an iterable of paragraphs,
+    never cutting a sentence unless the sentence alone is longer than a
+    chunk. Chunks never span two paragraphs, so editing one paragraph
+    leaves the other chunks unchanged (see the segment cache in
+    Audio/cache.py).
+    """
+    max_chars = max_chars or settings.AUDIO_TTS_CHUNK_CHARS
+
+    for paragraph in paragraphs:
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+
+        current = ""
+        for sentence in SENTENCE_END.split(paragraph):
+            if len(sentence) > max_chars:
+                if current:
+                    yield current
+                    current = ""
+                yield from _split_long_sentence(sentence, max_chars)
+                continue
+
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                yield current
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+
+        if current:
+            yield current
+
+def split_text(text, max_chars=None):
+    #all chunks of a text at once, see iter_chunks
+    return list(iter_chunks(PARAGRAPH_BREAK.split(text), max_chars))
+
+
+# MP3 helpers
+def concatenate_mp3(parts, fp):
+    """
+    Write mp3 parts to `fp` in order. MPEG frames are self-contained, so a
+    plain concatenation of tag-less streams is a valid mp3.
+    """
+    size = 0
+    for part in parts:
+        part = strip_tags(part)
+        fp.write(part)
+        size += len(part)
+    return size
+
+
+# Synthesis
+def synthesize(text, lang):
+    #engine is chosen by settings.AUDIO_TTS_BACKEND
+    return get_backend().synthesize(text, lang)
+
+def synthesize_stream(items, lang=None, max_workers=None, max_pending=None):
+    """
+    Synthesize chunks on a bounded thread pool as the consumer reads them.
+    `items` yields (text, cached) pairs; text is only synthesized when
+    cached is None, otherwise cached is passed through untouched.
+    Yields (text, cached, mp3 bytes or None, timing or None) in input order.
+
+    At most `max_pending` items are in flight: `items` is only advanced
+    as results are consumed, so a slow consumer stalls synthesis instead
+    of piling up audio in memory.
+    """
+    lang = lang or settings.AUDIO_TTS_LANGUAGE
+    max_workers = max_workers or settings.AUDIO_TTS_MAX_WORKERS
+    max_pending = max(max_pending or settings.AUDIO_TTS_MAX_PENDING, 1)
+
+    def work(index, text):
+        started = time.perf_counter()
+        data = synthesize(text, lang)
+        timing = {
+            "index": index,
+            "chars": len(text),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info(
+            "TTS chunk %s: %s chars in %ss",
+            timing["index"], timing["chars"], timing["seconds"],
+        )
+        return data, timing
+
+    def result(text, cached, future):
+        if future is None:
+            return text, cached, None, None
+        data, timing = future.result()
+        return text, cached, data, timing
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for index, (text, cached) in enumerate(items):
+                future = pool.submit(work, index, text) if cached is None else None
+                pending.append((text, cached, future))
+                if len(pending) >= max_pending:
+                    yield result(*pending.popleft())
+
+            while pending:
+                yield result(*pending.popleft())
+        except BaseException:
+            #also on GeneratorExit, when the consumer stops early
+            for _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+            raise
+
+def synthesize_chunks(chunks, lang=None, max_workers=None, on_chunk_done=None):
+    """
+    Synthesize a list of chunks, all audio is kept in memory.
+    Returns (audio parts in chunk order, per-chunk timings).
+    """
+    parts = []
+    timings = []
+    stream = synthesize_stream(
+        ((chunk, None) for chunk in chunks),
+        lang=lang,
+        max_workers=max_workers,
+        max_pending=len(chunks),
+    )
+    for done, (_, _, data, timing) in enumerate(stream, start=1):
+        parts.append(data)
+        timings.append(timing)
+        if on_chunk_done:
+            on_chunk_done(done, len(chunks))
+
+    return parts, timings
@@ -4,6 +4,8 @@ from .views import (
     AudioGenerateView,
     AudioDownloadView,
     AudioDeleteView,
+    AudioBatchGenerateView,
+    AudioBatchStatusView,
 )
 
 urlpatterns = [
@@ -18,4 +20,10 @@ urlpatterns = [
 
     # Delete audio file
     path('<int:document_id>/delete/', AudioDeleteView.as_view(), name='audio-delete'),
+
+    # Generate audio for many documents at once
+    path('batch/generate/', AudioBatchGenerateView.as_view(), name='audio-batch-generate'),
+
+    # Progress of a batch
+    path('batch/<uuid:batch_id>/', AudioBatchStatusView.as_view(), name='audio-batch-status'),
 ]
@@ -1,46 +1,24 @@
-import os
-import tempfile
-
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
-from django.http import FileResponse, Http404
-
-from gtts import gTTS
-import pdfplumber
-from docx import Document as DocxDocument
-
-from .models import AudioFile
-from .serializers import AudioFileSerializer, AudioGenerateSerializer
+from django.http import Http404
+
+from .models import AudioFile, AudioGenerationJob
+from .serializers import (
+    AudioBatchGenerateSerializer,
+    AudioFileSerializer,
+    AudioGenerateSerializer,
+    AudioGenerationJobSerializer,
+)
+from .jobs import enqueue_batch, enqueue_generation
+from .renditions import RETRY_AFTER, RenditionError, request_rendition, select_profile
 from Document.models import Document
+from Document.downloads import FileContentNegotiation, file_response
 
 from ActivityLog.utils import log_activity
 
-# Helper functions
-def extract_text_from_pdf(file_path):
-    text = []
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text.append(page_text)
-    return "\n\n".join(text)
-
-def extract_text_from_docx(file_path):
-    doc = DocxDocument(file_path)
-    return "\n\n".join(
-        [para.text for para in doc.paragraphs if para.text.strip()]
-    )
-
-def extract_text(document):
-    if document.file_type == "pdf":
-        return extract_text_from_pdf(document.file.path)
-    elif document.file_type == "docx":
-        return extract_text_from_docx(document.file.path)
-    return ""
-
 # Views
 class AudioMetadataView(APIView):
     permission_classes = [IsAuthenticated]
@@ -71,98 +49,171 @@ class AudioMetadataView(APIView):
             raise Http404("Document not found")
 
         except AudioFile.DoesNotExist:
-            return Response(
-                {"detail": "Audio not generated yet"},
-                status=status.HTTP_404_NOT_FOUND,
+            # Report the progress of the latest generation job instead
+            job = (
+                AudioGenerationJob.objects
+                .filter(document=document)
+                .order_by('-created_at')
+                .first()
             )
+            if job is None:
+                return Response(
+                    {"detail": "Audio not generated yet"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            return Response(AudioGenerationJobSerializer(job).data)
 
         serializer = AudioFileSerializer(audio)
-        return Response(serializer.data)
+        data = dict(serializer.data)
+        # The current audio is being regenerated: report that job's progress
+        job = AudioGenerationJob.objects.filter(in_flight=document.id).first()
+        if job is not None:
+            data["status"] = job.status
+            data["job"] = AudioGenerationJobSerializer(job).data
+        else:
+            data["status"] = AudioGenerationJob.STATUS_DONE
+        return Response(data)
 
 class AudioGenerateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, document_id):
         serializer = AudioGenerateSerializer(
-            data={},
+            data=request.data,
             context={"request": request, "document_id": document_id},
         )
         serializer.is_valid(raise_exception=True)
         document = serializer.validated_data["document"]
+        regenerate = serializer.validated_data["regenerate"]
 
-        try:
-            audio = AudioFile.objects.get(document=document)
-            if audio.audio_file:
-                log_activity(
-                    request=request,
-                    user=request.user,
-                    action="AUDIO_GENERATE",
-                    details=f"Audio already exists (Document ID {document.id})",
-                    status="success",
-                )
-                return Response(
-                    {"message": "Audio already exists"},
-                    status=status.HTTP_200_OK,
-                )
-        except AudioFile.DoesNotExist:
-            audio = AudioFile(document=document)
-
-        text = extract_text(document)
-        if not text.strip():
+        audio = AudioFile.objects.filter(document=document).first()
+        if audio and audio.audio_file and not regenerate:
             log_activity(
                 request=request,
                 user=request.user,
                 action="AUDIO_GENERATE",
-                details=f"No readable text found (Document ID {document.id})",
-                status="failed",
+                details=f"Audio already exists (Document ID {document.id})",
+                status="success",
             )
             return Response(
-                {"detail": "No readable text found in document"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"message": "Audio already exists"},
+                status=status.HTTP_200_OK,
             )
 
-        try:
-            tts = gTTS(text=text, lang="en")
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-                tts.save(temp_audio.name)
-                temp_audio_path = temp_audio.name
-
-            filename = f"{document.title.replace(' ', '_')}.mp3"
-
-            with open(temp_audio_path, "rb") as f:
-                audio.audio_file.save(filename, f, save=False)
+        # Synthesis runs in `manage.py run_audio_workers`, not in the request.
+        # Repeated requests (double clicks, retries) attach to the job in flight
+        job, created = enqueue_generation(document, request.user)
+
+        log_activity(
+            request=request,
+            user=request.user,
+            action="AUDIO_GENERATE",
+            details=(
+                f"Audio generation queued (Document ID {document.id}, Job ID {job.id})"
+                if created else
+                f"Audio generation already in progress (Document ID {document.id}, Job ID {job.id})"
+            ),
+            status="success",
+        )
 
-            audio.file_size = os.path.getsize(temp_audio_path)
-            audio.save()
+        return Response(
+            {
+                "message": "Audio generation queued" if created else "Audio generation already in progress",
+                "job_id": job.id,
+                "status": job.status,
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-            os.remove(temp_audio_path)
+class AudioBatchGenerateView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    def post(self, request):
+        serializer = AudioBatchGenerateSerializer(
+            data=request.data,
+            context={"request": request},
+        )
+        if not serializer.is_valid():
             log_activity(
                 request=request,
                 user=request.user,
-                action="AUDIO_GENERATE",
-                details=f"Audio generated (Document ID {document.id})",
-                status="success",
+                action="AUDIO_BATCH_GENERATE",
+                details="Batch generation rejected (validation error)",
+                status="failed",
             )
+            serializer.is_valid(raise_exception=True)
 
-            return Response(
-                {"message": "Audio generated successfully"},
-                status=status.HTTP_201_CREATED,
-            )
+        documents = serializer.validated_data["documents"]
+        skipped = []
 
-        except Exception as e:
-            log_activity(
-                request=request,
-                user=request.user,
-                action="AUDIO_GENERATE",
-                details=f"Generation failed (Document ID {document.id}): {str(e)}",
-                status="failed",
+        if not serializer.validated_data["regenerate"]:
+            existing = set(
+                AudioFile.objects
+                .filter(document__in=documents)
+                .exclude(audio_file="")
+                .values_list("document_id", flat=True)
             )
-            raise
+            skipped = [d.id for d in documents if d.id in existing]
+            documents = [d for d in documents if d.id not in existing]
+
+        # Workers share capacity round-robin between users, see Audio/jobs.py
+        batch_id, in_progress = (
+            enqueue_batch(documents, request.user) if documents else (None, {})
+        )
+        queued = [d.id for d in documents if d.id not in in_progress]
+
+        log_activity(
+            request=request,
+            user=request.user,
+            action="AUDIO_BATCH_GENERATE",
+            details=(
+                f"Batch generation queued ({len(queued)} documents, {len(in_progress)} in progress, "
+                f"{len(skipped)} skipped, batch {batch_id})"
+            ),
+            status="success",
+        )
+
+        return Response(
+            {
+                "message": "Audio generation queued",
+                "batch_id": batch_id,
+                "queued": queued,
+                # document id -> job already generating it
+                "in_progress": in_progress,
+                "skipped": skipped,
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+class AudioBatchStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, batch_id):
+        jobs = list(
+            AudioGenerationJob.objects
+            .filter(batch=batch_id, user=request.user)
+            .select_related("document")
+            .order_by("id")
+        )
+        if not jobs:
+            raise Http404("Batch not found")
+
+        counts = {choice: 0 for choice, _ in AudioGenerationJob.STATUS_CHOICES}
+        for job in jobs:
+            counts[job.status] += 1
+
+        return Response(
+            {
+                "batch_id": batch_id,
+                "counts": counts,
+                "jobs": AudioGenerationJobSerializer(jobs, many=True).data,
+            }
+        )
 
 class AudioDownloadView(APIView):
     permission_classes = [IsAuthenticated]
+    #the Accept header picks a rendition here
+    content_negotiation_class = FileContentNegotiation
 
     def get(self, request, document_id):
         try:
@@ -189,11 +240,52 @@ class AudioDownloadView(APIView):
             )
             raise Http404("Audio not found")
 
-        return FileResponse(
-            audio.audio_file.open("rb"),
-            as_attachment=True,
-            filename=os.path.basename(audio.audio_file.name),
+        # Compact renditions of shared audio, transcoded by the workers
+        try:
+            profile = select_profile(request)
+        except KeyError as e:
+            return Response(
+                {"detail": f"Unknown audio profile: {e.args[0]}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        field_file = audio.audio_file
+        if profile and audio.blob_id:
+            try:
+                rendition = request_rendition(audio.blob, profile)
+            except RenditionError as e:
+                # Fall back to the original, the Content-Type tells the client
+                rendition = None
+                log_activity(
+                    request=request,
+                    user=request.user,
+                    action="AUDIO_RENDITION",
+                    details=f"{e} (Document ID {document.id})",
+                    category="audio",
+                    status="failed",
+                )
+            else:
+                if rendition is None and "profile" in request.query_params:
+                    # Asked for by name: come back when it is transcoded
+                    response = Response(
+                        {"detail": "Audio rendition is being prepared", "profile": profile},
+                        status=status.HTTP_202_ACCEPTED,
+                    )
+                    response["Retry-After"] = str(RETRY_AFTER)
+                    return response
+            # Negotiated through Accept, or failed: the original plays meanwhile
+            if rendition is not None:
+                field_file = rendition.audio_file
+
+        # Players can seek with Range requests and revalidate with ETags
+        response = file_response(
+            request,
+            field_file,
+            filename=audio.download_name(field_file),
         )
+        if "profile" not in request.query_params:
+            response["Vary"] = "Accept"
+        return response
 
 class AudioDeleteView(APIView):
     permission_classes = [IsAuthenticated]
@@ -205,7 +297,7 @@ class AudioDeleteView(APIView):
             )
             audio = AudioFile.objects.get(document=document)
 
-            audio.audio_file.delete(save=False)
+            #removes the file, or drops a reference to shared cached audio
             audio.delete()
 
             log_activity(
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DocumentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Document'
+
+    def ready(self):
+        from . import signals  # noqa: F401
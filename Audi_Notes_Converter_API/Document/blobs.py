@@ -0,0 +1,94 @@
+"""
+Content-addressed document storage. Identical uploads share one
+DocumentBlob, Documents hold a reference each.
+"""
+import hashlib
+import os
+
+from django.db import IntegrityError, transaction
+
+from .models import DocumentBlob
+
+
+def content_sha256(fp):
+    #fallback when the upload handler did not hash the file
+    digest = hashlib.sha256()
+    if hasattr(fp, 'seek'):
+        fp.seek(0)
+    for chunk in fp.chunks() if hasattr(fp, 'chunks') else iter(lambda: fp.read(64 * 1024), b""):
+        digest.update(chunk)
+    if hasattr(fp, 'seek'):
+        fp.seek(0)
+    return digest.hexdigest()
+
+def find_blob(sha256):
+    blob = DocumentBlob.objects.filter(sha256=sha256).first()
+    #a row whose file went missing is useless, store the bytes again
+    if blob and blob.file.storage.exists(blob.file.name):
+        return blob
+    return None
+
+def store_blob(sha256, fp, size, filename):
+    """
+    Return the blob holding these bytes, writing `fp` to storage only if
+    no blob with the same hash exists yet.
+    """
+    blob = find_blob(sha256)
+    if blob is not None:
+        return blob
+
+    blob = DocumentBlob(sha256=sha256, file_size=size)
+    blob.file.save(filename, fp, save=False)
+
+    try:
+        with transaction.atomic():
+            blob.save()
+        return blob
+    except IntegrityError:
+        existing = DocumentBlob.objects.get(sha256=sha256)
+
+    #when the row's file went missing, ours was written under the same name
+    if blob.file.name != existing.file.name and existing.file.storage.exists(existing.file.name):
+        blob.file.delete(save=False)
+        return existing
+
+    #repair a blob whose file went missing
+    existing.file.name = blob.file.name
+    existing.file_size = size
+    existing.save(update_fields=['file', 'file_size'])
+    existing.documents.update(file=existing.file.name)
+    return existing
+
+def store_upload(uploaded_file):
+    sha256 = getattr(uploaded_file, 'sha256', None) or content_sha256(uploaded_file)
+    return store_blob(sha256, uploaded_file, uploaded_file.size, uploaded_file.name)
+
+def attach_blob(document, blob, filename):
+    """
+    Point `document` at the blob's bytes and move its reference from the
+    previous blob (if any). Returns False if the blob vanished meanwhile.
+    """
+    previous = document.blob if document.blob_id and document.blob_id != blob.id else None
+
+    with transaction.atomic():
+        if document.blob_id != blob.id and not blob.acquire():
+            return False
+
+        document.blob = blob
+        document.file.name = blob.file.name
+        document.file_size = blob.file_size
+        document.filename = filename
+        document.save()
+
+    if previous is not None:
+        previous.release()
+    return True
+
+def attach_upload(document, uploaded_file):
+    #store (or reuse) the upload's blob and point the document at it
+    filename = os.path.basename(uploaded_file.name)
+    for _ in range(2):
+        blob = store_upload(uploaded_file)
+        if attach_blob(document, blob, filename):
+            return blob
+    raise RuntimeError(f"Document blob {blob.sha256} was released while attaching")
@@ -0,0 +1,223 @@
+import hashlib
+import mimetypes
+import re
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+RANGE_HEADER = re.compile(r'^bytes=(.+)$')
+RANGE_SPEC = re.compile(r'^(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+# more ranges than this in one request is treated as abuse, the full file is sent
+MAX_RANGES = 20
+
+
+class FileContentNegotiation(DefaultContentNegotiation):
+    """
+    Download views answer with file bytes, not a rendered body, so an
+    Accept header naming only the file's media type must not be refused;
+    the first renderer is used for error bodies then.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+# Validators
+def file_validators(field_file):
+    """
+    Strong ETag and Last-Modified timestamp for a stored file. Stored files
+    are never rewritten in place (storage picks a new name instead), so
+    name, size and mtime identify the bytes.
+    """
+    storage = field_file.storage
+    size = storage.size(field_file.name)
+    try:
+        modified = storage.get_modified_time(field_file.name)
+    except NotImplementedError:
+        modified = None
+
+    tag = hashlib.sha256(
+        f"{field_file.name}:{size}:{modified.timestamp() if modified else ''}".encode()
+    ).hexdigest()[:32]
+    last_modified = int(modified.timestamp()) if modified else None
+    return size, quote_etag(tag), last_modified
+
+
+# Range parsing
+def parse_ranges(header, size):
+    """
+    Parse a `Range: bytes=...` header into sorted, merged (start, end)
+    pairs (inclusive). Returns None if the header should be ignored and []
+    if no range is satisfiable.
+    """
+    match = RANGE_HEADER.match(header.strip())
+    if not match or size == 0:
+        return None
+
+    ranges = []
+    for spec in match.group(1).split(','):
+        spec_match = RANGE_SPEC.match(spec.strip())
+        if not spec_match:
+            return None
+        first, last = spec_match.groups()
+
+        if first == '' and last == '':
+            return None
+        if first == '':
+            #suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+        ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _read_range(field_file, start, end):
+    f = field_file.storage.open(field_file.name, 'rb')
+    try:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        f.close()
+
+def _multipart_body(field_file, ranges, size, content_type, boundary):
+    for start, end in ranges:
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        yield from _read_range(field_file, start, end)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+# Responses
+def _range_applies(request, etag, last_modified):
+    #If-Range: only honour Range when the client's copy is still current
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return last_modified is not None and if_range == http_date(last_modified)
+
+def _set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+def offloaded_response(field_file, filename, content_type, as_attachment=True):
+    """
+    Empty response telling the front-end web server to send the file itself
+    (settings.FILE_DELIVERY_MODE). The server then handles ranges and
+    validators, and the Python worker is released immediately.
+    """
+    response = HttpResponse(content_type=content_type)
+    response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+
+    if settings.FILE_DELIVERY_MODE == "nginx":
+        #nginx `internal` location aliased to MEDIA_ROOT
+        response["X-Accel-Redirect"] = (
+            settings.FILE_DELIVERY_INTERNAL_PREFIX.rstrip("/") + "/" + quote(field_file.name)
+        )
+    elif settings.FILE_DELIVERY_MODE == "sendfile":
+        #Apache mod_xsendfile / lighttpd, needs a filesystem path
+        response["X-Sendfile"] = field_file.path
+    else:
+        raise ValueError(f"Unknown FILE_DELIVERY_MODE: {settings.FILE_DELIVERY_MODE}")
+
+    return response
+
+def file_response(request, field_file, filename, as_attachment=True):
+    """
+    Serve a stored file with ETag / Last-Modified validators, 304 and 412
+    handling and byte ranges (206, multipart/byteranges for several ranges),
+    or hand the transfer to the web server when delivery is offloaded.
+    """
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if settings.FILE_DELIVERY_MODE != "django":
+        return offloaded_response(field_file, filename, content_type, as_attachment)
+
+    size, etag, last_modified = file_validators(field_file)
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if conditional is not None:
+        return _set_validators(conditional, etag, last_modified)
+
+    range_header = request.META.get("HTTP_RANGE")
+    ranges = None
+    if range_header and _range_applies(request, etag, last_modified):
+        ranges = parse_ranges(range_header, size)
+
+    if ranges is None:
+        response = FileResponse(
+            field_file.storage.open(field_file.name, 'rb'),
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type=content_type,
+        )
+        return _set_validators(response, etag, last_modified)
+
+    if not ranges:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return _set_validators(response, etag, last_modified)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            _read_range(field_file, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        boundary = secrets.token_hex(16)
+        response = StreamingHttpResponse(
+            _multipart_body(field_file, ranges, size, content_type, boundary),
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+
+    response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return _set_validators(response, etag, last_modified)
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .docx_stream import iter_docx_text
+from .models import DocumentText
+from .pdf_worker import count_pages, extract_page_range, limit_memory, memory_headroom
+
+logger = logging.getLogger("documents")
+
+
+class TextExtractionError(Exception):
+    """
+    Raised when a document's text could not be extracted
+    """
+
+
+# Parsers
+def extract_pdf_pages(file_path):
+    """
+    Extract every page's text, in page order. Large PDFs are split into
+    page ranges handled by a pool of processes that lives for this one
+    PDF, so its memory is returned to the OS afterwards. Each process
+    takes range after range, paying the interpreter start-up only once.
+    Returns (page texts, peak RSS of any extraction process in KB).
+    """
+    page_count = count_pages(file_path)
+    per_task = settings.PDF_EXTRACTION_PAGES_PER_TASK
+    starts = list(range(0, page_count, per_task))
+    ends = [min(start + per_task, page_count) for start in starts]
+    processes = min(settings.PDF_EXTRACTION_PROCESSES, len(starts))
+    max_bytes = settings.PDF_EXTRACTION_MAX_MEMORY_MB * 1024 * 1024
+
+    if processes <= 1 or page_count < settings.PDF_EXTRACTION_PARALLEL_MIN_PAGES:
+        #small PDFs: starting processes costs more than it saves
+        processes = 1
+        with memory_headroom(max_bytes):
+            results = [extract_page_range(file_path, s, e) for s, e in zip(starts, ends)]
+    else:
+        #spawn: workers must not inherit the parent's DB connections and caches
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=limit_memory,
+            initargs=(max_bytes,),
+        ) as pool:
+            #map() yields in submission order, so pages stay ordered
+            results = list(pool.map(
+                extract_page_range, [file_path] * len(starts), starts, ends
+            ))
+
+    texts = [text for _, range_texts, _ in results for text in range_texts]
+    peaks = [peak for _, _, peak in results if peak is not None]
+    peak_kb = max(peaks) if peaks else None
+
+    logger.info(
+        "Extracted %s pages from %s with %s process(es), peak RSS %s KB",
+        page_count, file_path, max(processes, 1), peak_kb,
+    )
+    return texts, peak_kb
+
+def extract_text_from_pdf(file_path):
+    #returns (text, page count)
+    texts, _ = extract_pdf_pages(file_path)
+    return "\n\n".join(text for text in texts if text), len(texts)
+
+def extract_text_from_docx(file_path):
+    #docx has no fixed pagination, page count is unknown
+    #paragraphs and table cells are streamed from the XML, see docx_stream
+    text = "\n\n".join(iter_docx_text(file_path))
+    return text, None
+
+def parse_document(document):
+    if document.file_type == "pdf":
+        return extract_text_from_pdf(document.file.path)
+    elif document.file_type == "docx":
+        return extract_text_from_docx(document.file.path)
+    return "", None
+
+def file_sha256(field_file):
+    digest = hashlib.sha256()
+    with field_file.open("rb") as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def document_sha256(document):
+    #deduplicated files were hashed on upload
+    if document.blob_id:
+        return document.blob.sha256
+    return file_sha256(document.file)
+
+
+# Extraction artifact
+def schedule_extraction(document):
+    """
+    Mark the document's text as pending, a worker fills it in
+    (see `manage.py run_audio_workers`).
+    """
+    artifact, _ = DocumentText.objects.update_or_create(
+        document=document,
+        defaults={
+            'status': DocumentText.STATUS_PENDING,
+            'text': '',
+            'page_count': None,
+            'word_count': 0,
+            'source_hash': '',
+            'error': '',
+            'extracted_at': None,
+        },
+    )
+    return artifact
+
+def extract_document(document, artifact=None, source_hash=None):
+    #parse the file now and store the result
+    if artifact is None:
+        artifact, _ = DocumentText.objects.get_or_create(document=document)
+
+    try:
+        #a missing file fails here too, the artifact must not stay 'processing'
+        source_hash = source_hash or document_sha256(document)
+        text, page_count = parse_document(document)
+    except Exception as e:
+        logger.error("Text extraction failed for document %s: %s", document.id, e)
+        source_hash = source_hash or ''
+        artifact.status = DocumentText.STATUS_FAILED
+        artifact.text = ''
+        artifact.page_count = None
+        artifact.word_count = 0
+        artifact.error = str(e)
+    else:
+        artifact.status = DocumentText.STATUS_READY
+        artifact.text = text
+        artifact.page_count = page_count
+        artifact.word_count = len(text.split())
+        artifact.error = ''
+
+    artifact.source_hash = source_hash
+    artifact.extracted_at = timezone.now()
+    artifact.save()
+    return artifact
+
+def get_document_text(document):
+    """
+    Return the up to date extraction artifact. Text that was never
+    extracted, changed since, or is still queued is extracted here, claimed
+    like a queue item so no worker parses it as well. Text a worker is
+    extracting right now is waited for, up to DOCUMENT_TEXT_WAIT_TIMEOUT
+    seconds, after which the extraction is taken over as stuck.
+    """
+    source_hash = document_sha256(document)
+    deadline = time.monotonic() + settings.DOCUMENT_TEXT_WAIT_TIMEOUT
+
+    while True:
+        artifact = DocumentText.objects.filter(document=document).first()
+        finished = artifact is not None and artifact.status in (
+            DocumentText.STATUS_READY, DocumentText.STATUS_FAILED
+        )
+        if artifact is None or (finished and artifact.source_hash != source_hash):
+            artifact = schedule_extraction(document)
+
+        if artifact.status == DocumentText.STATUS_PENDING and claim_extraction(artifact):
+            artifact = extract_document(document, artifact, source_hash)
+        elif artifact.status == DocumentText.STATUS_PROCESSING and time.monotonic() >= deadline:
+            logger.warning("Text extraction of document %s looks stuck, extracting again", document.id)
+            artifact = extract_document(document, artifact, source_hash)
+
+        if artifact.status == DocumentText.STATUS_FAILED:
+            raise TextExtractionError(artifact.error or "Text extraction failed")
+        if artifact.status == DocumentText.STATUS_READY:
+            return artifact
+        time.sleep(1)
+
+
+# Background extraction
+def claim_next_extraction():
+    with transaction.atomic():
+        artifact = (
+            DocumentText.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('document')
+            .filter(status=DocumentText.STATUS_PENDING)
+            .order_by('id')
+            .first()
+        )
+        if artifact is None:
+            return None
+
+        artifact.status = DocumentText.STATUS_PROCESSING
+        artifact.save(update_fields=['status'])
+
+    return artifact
+
+def claim_extraction(artifact):
+    #pending -> processing, False if a worker claimed it first
+    return DocumentText.objects.filter(
+        pk=artifact.pk, status=DocumentText.STATUS_PENDING
+    ).update(status=DocumentText.STATUS_PROCESSING) == 1
+
+def run_next_extraction():
+    #returns False when nothing was pending
+    artifact = claim_next_extraction()
+    if artifact is None:
+        return False
+
+    document = artifact.document
+    if not document.file:
+        artifact.status = DocumentText.STATUS_FAILED
+        artifact.error = "Document has no file attached"
+        artifact.save(update_fields=['status', 'error'])
+        return True
+
+    extract_document(document, artifact)
+    return True
@@ -0,0 +1,94 @@
+"""
+Deferred removal of stored files. Deleting code queues names with
+PendingFileDeletion.schedule() inside its transaction; workers remove the
+files through the storage API once that transaction has committed.
+"""
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from .models import PendingFileDeletion
+
+logger = logging.getLogger("documents")
+
+
+def purge_pending_deletions(batch_size=None, storage=None):
+    """
+    Remove one batch of queued files. Returns the number of files handled,
+    0 when the queue is empty.
+    """
+    batch_size = batch_size or settings.FILE_DELETION_BATCH_SIZE
+    storage = storage or default_storage
+
+    with transaction.atomic():
+        #skip_locked: several workers drain disjoint batches
+        pending = list(
+            PendingFileDeletion.objects
+            .select_for_update(skip_locked=True)
+            .filter(attempts__lt=settings.FILE_DELETION_MAX_ATTEMPTS)
+            .order_by('id')[:batch_size]
+        )
+        if not pending:
+            return 0
+
+        done = []
+        for item in pending:
+            try:
+                #deleting a missing file is a no-op for Django storages
+                storage.delete(item.name)
+            except Exception as e:
+                logger.warning("Could not delete stored file %s: %s", item.name, e)
+                PendingFileDeletion.objects.filter(pk=item.pk).update(
+                    attempts=F('attempts') + 1, last_error=str(e)
+                )
+            else:
+                done.append(item.pk)
+
+        PendingFileDeletion.objects.filter(pk__in=done).delete()
+
+    return len(pending)
+
+
+# Orphan sweeping
+def iter_stored_files(prefix, storage=None):
+    #every file name under `prefix`, directory by directory
+    storage = storage or default_storage
+    directories = [prefix.rstrip('/')]
+    while directories:
+        directory = directories.pop()
+        try:
+            subdirectories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        directories.extend(f"{directory}/{name}" for name in subdirectories)
+        for name in files:
+            yield f"{directory}/{name}"
+
+def referenced_names(names):
+    """
+    The subset of `names` that a row still points to, or that is already
+    queued for deletion.
+    """
+    from Audio.models import AudioBlob, AudioFile, AudioRendition, AudioSegment
+    from .models import Document, DocumentBlob
+
+    references = [
+        (Document, 'file'),
+        (DocumentBlob, 'file'),
+        (AudioFile, 'audio_file'),
+        (AudioBlob, 'audio_file'),
+        (AudioSegment, 'audio_file'),
+        (AudioRendition, 'audio_file'),
+        (PendingFileDeletion, 'name'),
+    ]
+    found = set()
+    for model, field in references:
+        found.update(
+            model.objects
+            .filter(**{f"{field}__in": names})
+            .values_list(field, flat=True)
+        )
+    return found
@@ -0,0 +1,61 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from Document.blobs import attach_blob, store_blob
+from Document.extraction import file_sha256
+from Document.models import Document, PendingFileDeletion
+
+
+class Command(BaseCommand):
+    help = "Move documents uploaded before deduplication into shared content-addressed blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Documents loaded per batch',
+        )
+
+    def handle(self, *args, **options):
+        moved = shared = missing = 0
+        last_id = 0
+
+        while True:
+            #keyset over the primary key, moved rows drop out of the filter
+            batch = list(
+                Document.objects
+                .filter(blob__isnull=True, id__gt=last_id)
+                .exclude(file='')
+                .exclude(file__isnull=True)
+                .order_by('id')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for document in batch:
+                old_name = document.file.name
+                storage = document.file.storage
+                if not storage.exists(old_name):
+                    missing += 1
+                    continue
+
+                sha256 = file_sha256(document.file)
+                with storage.open(old_name, 'rb') as f:
+                    blob = store_blob(sha256, f, storage.size(old_name), old_name)
+
+                if blob.ref_count:
+                    shared += 1
+                if not attach_blob(document, blob, document.filename or os.path.basename(old_name)):
+                    continue
+
+                if old_name != blob.file.name:
+                    PendingFileDeletion.schedule(old_name)
+                moved += 1
+
+        self.stdout.write(
+            f"{moved} documents moved to blobs ({shared} shared an existing blob), "
+            f"{missing} files missing"
+        )
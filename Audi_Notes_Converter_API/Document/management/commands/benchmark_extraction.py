@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from Document.docx_stream import EXTRACTORS, run_extractor
+from Document.extraction import extract_pdf_pages
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare text extraction time and peak memory: serial vs process pool "
+        "on a PDF, python-docx vs streaming on a DOCX"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='PDF or DOCX file to extract')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Pool size for the parallel PDF run',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.docx':
+            for name in EXTRACTORS:
+                self.run_docx(name, path)
+            return
+
+        if extension != '.pdf':
+            raise CommandError("Only PDF and DOCX files are supported")
+
+        #parallel first: the serial run's peak is this process' lifetime peak
+        self.run("parallel", path, options['processes'])
+        self.run("serial", path, 1)
+
+    def run(self, label, path, processes):
+        with override_settings(
+            PDF_EXTRACTION_PROCESSES=processes,
+            PDF_EXTRACTION_PARALLEL_MIN_PAGES=0,
+        ):
+            started = time.perf_counter()
+            texts, peak_kb = extract_pdf_pages(path)
+            elapsed = time.perf_counter() - started
+
+        chars = sum(len(text) for text in texts)
+        self.stdout.write(
+            f"{label}: {len(texts)} pages, {chars} chars in {elapsed:.2f}s, "
+            f"peak RSS {peak_kb} KB"
+        )
+
+    def run_docx(self, name, path):
+        #a fresh process per extractor, so its peak RSS is not the other's
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            blocks, chars, elapsed, peak_kb = pool.submit(run_extractor, name, path).result()
+
+        self.stdout.write(
+            f"{name}: {blocks} blocks, {chars} chars in {elapsed:.2f}s, "
+            f"peak RSS {peak_kb} KB"
+        )
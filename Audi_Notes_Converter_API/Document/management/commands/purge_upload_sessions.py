@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Document.uploads import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete expired resumable upload sessions and their stored chunks"
+
+    def handle(self, *args, **options):
+        count = purge_expired_sessions()
+        self.stdout.write(f"Purged {count} upload session(s)")
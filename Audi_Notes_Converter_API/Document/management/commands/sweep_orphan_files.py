@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Document.file_cleanup import iter_stored_files, purge_pending_deletions, referenced_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Find stored files under documents/ and audio/ that no row references "
+        "and delete them (report only unless --delete is given). Upload chunks "
+        "under uploads/ belong to upload sessions, see purge_upload_sessions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix',
+            action='append',
+            help='Storage directory to sweep, repeatable (default: documents and audio)',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Hours a file must be old before it counts as orphaned',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Names checked against the database per query',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete the orphans instead of only listing them',
+        )
+
+    def handle(self, *args, **options):
+        #files queued by deletes are handled first, they are not orphans
+        while purge_pending_deletions():
+            pass
+
+        # a file is written before its row is committed, young files are skipped
+        cutoff = None
+        if options['min_age'] > 0:
+            cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        scanned = orphans = freed = 0
+
+        for prefix in options['prefix'] or ['documents', 'audio']:
+            batch = []
+            for name in iter_stored_files(prefix):
+                scanned += 1
+                batch.append(name)
+                if len(batch) >= options['batch_size']:
+                    found, size = self.sweep(batch, cutoff, options['delete'])
+                    orphans, freed = orphans + found, freed + size
+                    batch = []
+            if batch:
+                found, size = self.sweep(batch, cutoff, options['delete'])
+                orphans, freed = orphans + found, freed + size
+
+        verb = "deleted" if options['delete'] else "found"
+        self.stdout.write(
+            f"Scanned {scanned} files, {verb} {orphans} orphans ({freed} bytes)"
+        )
+
+    def sweep(self, names, cutoff, delete):
+        referenced = referenced_names(names)
+        found = size = 0
+
+        for name in names:
+            if name in referenced:
+                continue
+            try:
+                if cutoff is not None and default_storage.get_modified_time(name) > cutoff:
+                    continue
+            except NotImplementedError:
+                #no timestamp, a fresh file can't be told from an orphan
+                if cutoff is not None:
+                    continue
+
+            found += 1
+            size += default_storage.size(name)
+            if delete:
+                default_storage.delete(name)
+            else:
+                self.stdout.write(name)
+
+        return found, size
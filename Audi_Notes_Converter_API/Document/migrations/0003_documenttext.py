@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-01-19 11:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Document', '0002_document_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('text', models.TextField(blank=True)),
+                ('page_count', models.PositiveIntegerField(blank=True, help_text='Number of pages (PDF only)', null=True)),
+                ('word_count', models.PositiveIntegerField(default=0)),
+                ('source_hash', models.CharField(blank=True, help_text='sha256 of the file the text was extracted from', max_length=64)),
+                ('error', models.TextField(blank=True)),
+                ('extracted_at', models.DateTimeField(blank=True, null=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='extracted_text', to='Document.document')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status'], name='Document_do_status_00a29b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-02-09 15:48
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Document', '0003_documenttext'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('file_type', models.CharField(choices=[('pdf', 'PDF'), ('docx', 'DOCX')], max_length=10)),
+                ('total_size', models.BigIntegerField(help_text='Announced file size in bytes')),
+                ('chunk_size', models.PositiveIntegerField(help_text='Maximum chunk size in bytes')),
+                ('chunks', models.JSONField(blank=True, default=list, help_text='Storage name, size and sha256 of every received chunk')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('completed', 'Completed')], default='uploading', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Document.document')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
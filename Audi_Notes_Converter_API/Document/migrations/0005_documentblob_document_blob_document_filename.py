@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-02-10 10:12
+
+import Document.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Document', '0004_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(help_text='sha256 of the file content', max_length=64, unique=True)),
+                ('file', models.FileField(upload_to=Document.models.document_blob_upload_path)),
+                ('file_size', models.BigIntegerField(help_text='File size in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Number of Document rows using this blob')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='blob',
+            field=models.ForeignKey(blank=True, help_text='Stored bytes this document points to (file is the blob file)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='Document.documentblob'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='filename',
+            field=models.CharField(blank=True, help_text='Name of the uploaded file', max_length=255),
+        ),
+    ]
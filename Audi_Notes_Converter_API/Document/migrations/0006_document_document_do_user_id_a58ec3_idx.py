@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-02-12 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Document', '0005_documentblob_document_blob_document_filename'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='Document_do_user_id_a58ec3_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 import os
+import uuid
 
 # Create your models here.
 User = settings.AUTH_USER_MODEL
@@ -12,6 +14,46 @@ def document_upload_path(instance, filename):
     #media/documents/user_<id>/<pdf|docx>/<filename>
     return f"documents/user_{instance.user_id}/{extension}/{filename}"
 
+def document_blob_upload_path(instance, filename):
+    #identical files are stored once per content hash
+    #media/documents/blobs/<ab>/<sha256>.<pdf|docx>
+    extension = filename.split('.')[-1].lower()
+    return f"documents/blobs/{instance.sha256[:2]}/{instance.sha256}.{extension}"
+
+class DocumentBlob(models.Model):
+    """
+    Uploaded file bytes shared by every Document with the same content.
+    """
+    sha256 = models.CharField(max_length=64,unique=True,help_text='sha256 of the file content')
+    file = models.FileField(upload_to=document_blob_upload_path)
+    file_size = models.BigIntegerField(help_text='File size in bytes')
+    ref_count = models.PositiveIntegerField(default=0,help_text='Number of Document rows using this blob')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Document blob {self.sha256[:12]} ({self.ref_count} refs)"
+
+    def acquire(self):
+        #returns False if the blob was released concurrently
+        return DocumentBlob.objects.filter(pk=self.pk).update(
+            ref_count=models.F('ref_count') + 1
+        ) == 1
+
+    def release(self):
+        #drop one reference, the file goes away with the last one
+        with transaction.atomic():
+            blob = DocumentBlob.objects.select_for_update().filter(pk=self.pk).first()
+            if blob is None:
+                return
+
+            if blob.ref_count > 1:
+                blob.ref_count -= 1
+                blob.save(update_fields=['ref_count'])
+                return
+
+            PendingFileDeletion.schedule(blob.file.name)
+            blob.delete()
+
 class Document(models.Model):
     FILE_TYPE_CHOICES = (
         ('pdf','PDF'),('docx','DOCX'),
@@ -21,6 +63,15 @@ class Document(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     file = models.FileField(upload_to=document_upload_path,null=True,blank=True)
+    filename = models.CharField(max_length=255,blank=True,help_text='Name of the uploaded file')
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='documents',
+        help_text='Stored bytes this document points to (file is the blob file)'
+    )
     file_type = models.CharField(max_length=10,choices=FILE_TYPE_CHOICES)
     file_size = models.BigIntegerField(help_text='File size in bytes')
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -28,13 +79,113 @@ class Document(models.Model):
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            #keyset pagination of a user's documents, newest first
+            models.Index(fields=['user', '-uploaded_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.file_type})"
     
-    def delete(self, *args, **kwargs):
-        #Ensure file is deleted from storage when the document is deleted
-        if self.file and os.path.isfile(self.file.path):
-            os.remove(self.file.path)
+    @property
+    def download_name(self):
+        return self.filename or os.path.basename(self.file.name)
+
+    # Stored files are removed by the post_delete signal (see signals.py),
+    # which also runs for cascades and queryset deletes
+
+class PendingFileDeletion(models.Model):
+    """
+    Stored file to remove once the deleting transaction has committed,
+    drained in batches by the workers through the storage API.
+    """
+    name = models.CharField(max_length=500,help_text='Storage name of the file')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending deletion of {self.name}"
+
+    @classmethod
+    def schedule(cls, *names):
+        #inserted in the caller's transaction, a rollback keeps the file
+        names = [name for name in names if name]
+        if names:
+            cls.objects.bulk_create([cls(name=name) for name in names])
+
+class DocumentText(models.Model):
+    #extracted text, filled in the background after upload
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING,'Pending'),
+        (STATUS_PROCESSING,'Processing'),
+        (STATUS_READY,'Ready'),
+        (STATUS_FAILED,'Failed'),
+    )
+
+    document = models.OneToOneField(Document,on_delete=models.CASCADE,related_name='extracted_text')
+    status = models.CharField(max_length=10,choices=STATUS_CHOICES,default=STATUS_PENDING)
+    text = models.TextField(blank=True)
+    page_count = models.PositiveIntegerField(null=True,blank=True,help_text='Number of pages (PDF only)')
+    word_count = models.PositiveIntegerField(default=0)
+    source_hash = models.CharField(max_length=64,blank=True,help_text='sha256 of the file the text was extracted from')
+    error = models.TextField(blank=True)
+    extracted_at = models.DateTimeField(null=True,blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f"Text of document {self.document_id} ({self.status})"
+
+class UploadSession(models.Model):
+    #resumable upload, chunks are stored under uploads/<session id>/ until finalized
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETED = 'completed'
+
+    STATUS_CHOICES = (
+        (STATUS_UPLOADING,'Uploading'),
+        (STATUS_COMPLETED,'Completed'),
+    )
+
+    id = models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    user = models.ForeignKey(User,on_delete=models.CASCADE,related_name='upload_sessions')
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=10,choices=Document.FILE_TYPE_CHOICES)
+    total_size = models.BigIntegerField(help_text='Announced file size in bytes')
+    chunk_size = models.PositiveIntegerField(help_text='Maximum chunk size in bytes')
+    chunks = models.JSONField(default=list,blank=True,help_text='Storage name, size and sha256 of every received chunk')
+    status = models.CharField(max_length=10,choices=STATUS_CHOICES,default=STATUS_UPLOADING)
+    document = models.ForeignKey(Document,on_delete=models.SET_NULL,null=True,blank=True,related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received_bytes}/{self.total_size} bytes)"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    @property
+    def next_chunk(self):
+        return len(self.chunks)
+
+    @property
+    def received_bytes(self):
+        return sum(chunk['size'] for chunk in self.chunks)
 
-        return super().delete(*args, **kwargs)
+    def chunk_name(self, index):
+        return f"uploads/{self.id}/{index:06d}.part"
@@ -0,0 +1,68 @@
+# Runs inside extraction worker processes, keep it free of Django imports
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import pdfplumber
+
+
+def limit_memory(max_bytes):
+    #process pool initializer: cap the address space of the worker
+    if resource and max_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+def _address_space():
+    #current virtual size of this process, None where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def memory_headroom(max_bytes):
+    """
+    In-process counterpart of limit_memory(): the address space may grow by
+    at most `max_bytes` while the block runs, the previous limit is restored
+    afterwards. Allocations past it raise MemoryError.
+    """
+    current = _address_space() if resource and max_bytes else None
+    if current is None:
+        yield
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current + max_bytes
+    for bound in (soft, hard):
+        if bound != resource.RLIM_INFINITY:
+            limit = min(limit, bound)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+def peak_memory_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def count_pages(file_path):
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+def extract_page_range(file_path, start, end):
+    """
+    Extract pages [start, end) (0-based). Each page's layout cache is
+    released right after its text is read.
+    Returns (start, list of page texts, peak RSS of this process in KB).
+    """
+    texts = []
+    with pdfplumber.open(file_path, pages=list(range(start + 1, end + 1))) as pdf:
+        for page in pdf.pages:
+            texts.append(page.extract_text() or "")
+            getattr(page, "close", page.flush_cache)()
+    return start, texts, peak_memory_kb()
@@ -1,20 +1,75 @@
 from rest_framework import serializers
-from .models import Document
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.urls import reverse
+from .blobs import attach_upload
+from .models import Document, PendingFileDeletion, UploadSession
 import os
 
+def validate_document_extension(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ['.pdf', '.docx']:
+        raise serializers.ValidationError("Only PDF and DOCX files are allowed")
+    return filename
+
+def validate_document_file(file):
+    # validate file size (10MB max), larger files go through resumable uploads
+    max_size = 10 * 1024 * 1024
+    if file.size > max_size:
+        raise serializers.ValidationError("File size must not exceed 10MB")
+
+    # validate file extension
+    validate_document_extension(file.name)
+
+    return file
+
 class DocumentSerializer(serializers.ModelSerializer):
+    # Only with ?include=audio, the view then loads audio in the same query
+    audio = serializers.SerializerMethodField()
+
     class Meta:
         model = Document
         fields = [
             'id',
             'title',
             'description',
+            'filename',
             'file_type',
             'file_size',
             'uploaded_at',
             'updated_at',
+            'audio',
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'filename']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('include_audio'):
+            self.fields.pop('audio')
+
+    def get_audio(self, obj):
+        try:
+            audio = obj.audio
+        except ObjectDoesNotExist:
+            # latest_audio_job_status is annotated by DocumentViewSet,
+            # a finished job without audio means the audio was deleted since
+            job_status = getattr(obj, 'latest_audio_job_status', None)
+            return {
+                'status': job_status if job_status not in (None, 'done') else 'not_generated',
+                'file_size': None,
+                'duration': None,
+                'download_url': None,
+            }
+
+        download_url = reverse('audio-download', kwargs={'document_id': obj.id})
+        request = self.context.get('request')
+        return {
+            'status': 'done',
+            'file_size': audio.file_size,
+            'duration': audio.duration,
+            'download_url': request.build_absolute_uri(download_url) if request else download_url,
+        }
 
 
 class DocumentUploadSerializer(serializers.ModelSerializer):
@@ -31,20 +86,10 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def validate_file(self, file):
-        # validate file size (10MB max)
-        max_size = 10 * 1024 * 1024
-        if file.size > max_size:
-            raise serializers.ValidationError("File size must not exceed 10MB")
-
-        # validate file extension
-        ext = os.path.splitext(file.name)[1].lower()
-        if ext not in ['.pdf', '.docx']:
-            raise serializers.ValidationError("Only PDF and DOCX files are allowed")
-
-        return file
+        return validate_document_file(file)
 
     def create(self, validated_data):
-        uploaded_file = validated_data.get('file')
+        uploaded_file = validated_data.pop('file')
 
         # Ownership should be set in the ViewSet (perform_create)
         file_extension = os.path.splitext(uploaded_file.name)[1].lower().replace('.', '')
@@ -54,10 +99,85 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
 
         #DRF handle object creation
         #Prevents duplication and keeps consistency
-        return super().create(validated_data)
+        with transaction.atomic():
+            document = super().create(validated_data)
+            # Identical files are stored once and shared
+            attach_upload(document, uploaded_file)
+        return document
 
 class DocumentUpdateSerializer(serializers.ModelSerializer):
-    # Updating document metadata only
+    # Updating document metadata, optionally replacing the file
+    file = serializers.FileField(write_only=True, required=False)
+
     class Meta:
         model = Document
-        fields = ['title', 'description']
+        fields = ['title', 'description', 'file']
+
+    def validate_file(self, file):
+        return validate_document_file(file)
+
+    def update(self, instance, validated_data):
+        uploaded_file = validated_data.pop('file', None)
+        # Files stored before deduplication belong to this document alone
+        old_file = instance.file.name if instance.file and not instance.blob_id else None
+
+        if uploaded_file:
+            file_extension = os.path.splitext(uploaded_file.name)[1].lower().replace('.', '')
+            validated_data['file_type'] = file_extension
+
+        # A failed attach rolls back the metadata and the blob ref counts too
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+
+            if uploaded_file:
+                # The previous blob reference is released when attaching
+                attach_upload(instance, uploaded_file)
+
+            # Remove the replaced file from storage
+            if uploaded_file and old_file and old_file != instance.file.name:
+                PendingFileDeletion.schedule(old_file)
+
+        return instance
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    # Starting a resumable upload and reporting its progress
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    received_bytes = serializers.IntegerField(read_only=True)
+    next_chunk = serializers.IntegerField(read_only=True)
+    document_id = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'upload_id',
+            'title',
+            'description',
+            'filename',
+            'total_size',
+            'chunk_size',
+            'received_bytes',
+            'next_chunk',
+            'status',
+            'document_id',
+            'expires_at',
+        ]
+        read_only_fields = ['chunk_size', 'status', 'expires_at']
+
+    def validate_filename(self, filename):
+        return validate_document_extension(filename)
+
+    def validate_total_size(self, total_size):
+        max_size = settings.DOCUMENT_RESUMABLE_MAX_SIZE
+        if total_size <= 0:
+            raise serializers.ValidationError("File size must be positive")
+        if total_size > max_size:
+            raise serializers.ValidationError(
+                f"File size must not exceed {max_size // (1024 * 1024)}MB"
+            )
+        return total_size
+
+
+class UploadFinalizeSerializer(serializers.Serializer):
+    # sha256 of the whole file, optional end to end check
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False)
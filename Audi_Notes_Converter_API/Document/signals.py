@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Document, PendingFileDeletion
+
+
+@receiver(post_delete, sender=Document)
+def release_document_file(sender, instance, **kwargs):
+    #also runs for cascades (deleting a user) which skip Document.delete()
+    if instance.blob_id:
+        instance.blob.release()
+    elif instance.file:
+        PendingFileDeletion.schedule(instance.file.name)
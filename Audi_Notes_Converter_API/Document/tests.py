@@ -1,3 +1,460 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import extraction
+from .blobs import attach_upload, store_upload
+from .docx_stream import iter_docx_text
+from .downloads import file_response, parse_ranges
+from .extraction import extract_text_from_pdf, get_document_text, run_next_extraction, schedule_extraction
+from .file_cleanup import purge_pending_deletions
+from .models import Document, DocumentBlob, DocumentText, PendingFileDeletion
+from .uploads import UploadError, finalize_session, start_session, store_chunk
+
+from Audio.models import AudioFile, AudioGenerationJob
 
 # Create your tests here.
+class HashingUploadHandlerTests(SimpleTestCase):
+    """
+    Multipart uploads parsed by the FILE_UPLOAD_HANDLERS chain from settings
+    """
+
+    def upload(self, content):
+        request = RequestFactory().post(
+            '/', {'file': SimpleUploadedFile('notes.txt', content, content_type='text/plain')}
+        )
+        return request.FILES['file']
+
+    def test_small_file_is_kept_in_memory_and_hashed(self):
+        content = b"short notes\n" * 10
+        uploaded = self.upload(content)
+
+        self.assertIsInstance(uploaded, InMemoryUploadedFile)
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(uploaded.read(), content)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=64)
+    def test_large_file_is_streamed_to_disk_and_hashed(self):
+        content = b"longer notes\n" * 1000
+        uploaded = self.upload(content)
+
+        self.assertIsInstance(uploaded, TemporaryUploadedFile)
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(uploaded.size, len(content))
+
+
+class TempMediaMixin:
+    #stored files go to a throwaway MEDIA_ROOT
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class StoreBlobTests(TempMediaMixin, TestCase):
+    content = b"%PDF-1.4 notes"
+
+    def upload(self):
+        return SimpleUploadedFile('notes.pdf', self.content, content_type='application/pdf')
+
+    def test_same_bytes_share_one_blob(self):
+        first = store_upload(self.upload())
+        second = store_upload(self.upload())
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+
+    def test_blob_with_missing_file_is_repaired(self):
+        blob = store_upload(self.upload())
+        blob.file.storage.delete(blob.file.name)
+
+        repaired = store_upload(self.upload())
+
+        self.assertEqual(repaired.pk, blob.pk)
+        repaired.refresh_from_db()
+        with repaired.file.storage.open(repaired.file.name, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+
+class ExtractionTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="reader")
+
+    def test_missing_file_marks_the_text_failed(self):
+        document = Document.objects.create(
+            user=self.user, title="Notes", file="documents/missing.pdf", file_type="pdf", file_size=0
+        )
+        schedule_extraction(document)
+
+        self.assertTrue(run_next_extraction())
+
+        artifact = DocumentText.objects.get(document=document)
+        self.assertEqual(artifact.status, DocumentText.STATUS_FAILED)
+        self.assertTrue(artifact.error)
+        self.assertIsNotNone(artifact.extracted_at)
+
+    def test_text_extracted_in_the_background_is_reused(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "notes.pdf")
+        write_pdf(path, ["Stored once"])
+        document = Document(user=self.user, title="Notes", file_type="pdf", file_size=0)
+        with open(path, "rb") as f:
+            attach_upload(document, SimpleUploadedFile("notes.pdf", f.read()))
+        schedule_extraction(document)
+        run_next_extraction()
+
+        with mock.patch.object(extraction, "parse_document") as parse:
+            artifact = get_document_text(document)
+
+        parse.assert_not_called()
+        self.assertEqual(artifact.text, "Stored once")
+        self.assertEqual(artifact.source_hash, document.blob.sha256)
+
+
+class DocxStreamTests(SimpleTestCase):
+    NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+    def docx(self, body):
+        path = os.path.join(tempfile.mkdtemp(), 'notes.docx')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('word/document.xml', f'<w:document {self.NS}><w:body>{body}</w:body></w:document>')
+        return path
+
+    def paragraph(self, text):
+        return f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+
+    def table(self, *cells):
+        return '<w:tbl><w:tr>' + ''.join(f'<w:tc>{cell}</w:tc>' for cell in cells) + '</w:tr></w:tbl>'
+
+    def test_nested_table_text_stays_inside_its_outer_cell(self):
+        inner = self.table(self.paragraph('inner'))
+        outer = self.table(
+            self.paragraph('before') + inner + self.paragraph('after'),
+            self.paragraph('second'),
+        )
+        path = self.docx(self.paragraph('intro') + outer + self.paragraph('outro'))
+
+        self.assertEqual(
+            list(iter_docx_text(path)),
+            ['intro', 'before\ninner\nafter', 'second', 'outro'],
+        )
+
+
+class ParseRangesTests(SimpleTestCase):
+    def test_ranges_are_clamped_sorted_and_merged(self):
+        self.assertEqual(parse_ranges("bytes=50-, 0-9, 5-20, -5", 100), [(0, 20), (50, 99)])
+
+    def test_unsatisfiable_and_invalid_headers(self):
+        self.assertEqual(parse_ranges("bytes=200-300", 100), [])
+        self.assertIsNone(parse_ranges("bytes=20-10", 100))
+        self.assertIsNone(parse_ranges("items=0-1", 100))
+
+
+class FileResponseTests(TempMediaMixin, SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        name = default_storage.save("documents/sample.bin", ContentFile(self.content))
+        self.field_file = SimpleNamespace(name=name, storage=default_storage)
+
+    def get(self, **headers):
+        request = RequestFactory().get("/", **headers)
+        return file_response(request, self.field_file, "sample.bin")
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_download_carries_validators(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertTrue(response["ETag"])
+
+    def test_single_range(self):
+        response = self.get(HTTP_RANGE="bytes=10-19")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+        self.assertEqual(self.body(response), self.content[10:20])
+
+    def test_several_ranges_are_sent_as_multipart(self):
+        response = self.get(HTTP_RANGE="bytes=0-1,100-101")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges"))
+        body = self.body(response)
+        self.assertIn(b"Content-Range: bytes 100-101/1024", body)
+        self.assertIn(self.content[100:102], body)
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE="bytes=5000-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()["ETag"]
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_range_is_ignored_when_if_range_is_stale(self):
+        response = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    @override_settings(FILE_DELIVERY_MODE="nginx", FILE_DELIVERY_INTERNAL_PREFIX="/protected-media/")
+    def test_nginx_delivery_sends_no_body(self):
+        response = self.get(HTTP_RANGE="bytes=0-9")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.field_file.name)
+        self.assertIn("sample.bin", response["Content-Disposition"])
+
+    @override_settings(FILE_DELIVERY_MODE="sendfile")
+    def test_sendfile_delivery_points_at_the_file_path(self):
+        self.field_file.path = default_storage.path(self.field_file.name)
+
+        response = self.get()
+
+        self.assertEqual(response["X-Sendfile"], self.field_file.path)
+
+
+@override_settings(DOCUMENT_UPLOAD_CHUNK_SIZE=4)
+class ResumableUploadTests(TempMediaMixin, TestCase):
+    content = b"0123456789"
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="uploader")
+        self.session = start_session(self.user, "Notes", "notes.pdf", len(self.content))
+
+    def send(self, index, data=None, checksum=None):
+        data = self.content[index * 4:index * 4 + 4] if data is None else data
+        checksum = checksum or hashlib.sha256(data).hexdigest()
+        self.session = store_chunk(self.session, index, io.BytesIO(data), checksum)
+        return self.session
+
+    def test_chunks_are_joined_into_a_document(self):
+        for index in range(3):
+            self.send(index)
+
+        document = finalize_session(self.session, hashlib.sha256(self.content).hexdigest())
+
+        self.assertEqual(document.file_size, len(self.content))
+        self.assertEqual(document.filename, "notes.pdf")
+        with document.file.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+        #chunk files go once the transaction commits
+        self.assertEqual(PendingFileDeletion.objects.count(), 3)
+
+    def test_resent_chunk_is_accepted_once(self):
+        self.send(0)
+        self.send(0)
+
+        self.assertEqual(self.session.next_chunk, 1)
+
+    def test_chunks_out_of_order_or_corrupt_are_rejected(self):
+        with self.assertRaisesMessage(UploadError, "Expected chunk 0"):
+            self.send(1)
+        with self.assertRaisesMessage(UploadError, "Checksum mismatch"):
+            self.send(0, checksum="0" * 64)
+        with self.assertRaisesMessage(UploadError, "shorter than"):
+            self.send(0, data=b"01")
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        self.send(0)
+
+        with self.assertRaisesMessage(UploadError, "Upload incomplete"):
+            finalize_session(self.session)
+
+
+class DocumentListTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.documents = [
+            Document.objects.create(user=self.user, title=f"Doc {i}", file_type="pdf", file_size=0)
+            for i in range(5)
+        ]
+        #ties on uploaded_at are broken by id
+        Document.objects.filter(user=self.user).update(uploaded_at=timezone.now())
+        other = get_user_model().objects.create_user(username="other")
+        Document.objects.create(user=other, title="Not mine", file_type="pdf", file_size=0)
+
+    def test_cursor_pages_walk_every_document_once_newest_first(self):
+        ids, url = [], reverse("documents-list") + "?page_size=2"
+        while url:
+            page = self.client.get(url).data
+            ids.extend(row["id"] for row in page["results"])
+            url = page["next"]
+
+        self.assertEqual(ids, [d.id for d in reversed(self.documents)])
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get(reverse("documents-list"), {"page_size": 2}).data
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+
+        self.assertEqual([r["id"] for r in back["results"]], [r["id"] for r in first["results"]])
+        self.assertNotIn("count", first)
+
+    def test_count_on_request_and_bad_cursor(self):
+        page = self.client.get(reverse("documents-list"), {"count": "true"}).data
+        self.assertEqual(page["count"], 5)
+
+        response = self.client.get(reverse("documents-list"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_audio_status_is_embedded_without_extra_queries(self):
+        done, running = self.documents[:2]
+        AudioFile.objects.create(document=done, audio_file="audio/done.mp3", file_size=10, duration=3)
+        AudioGenerationJob.objects.create(
+            document=running, user=self.user, status=AudioGenerationJob.STATUS_RUNNING
+        )
+
+        with self.assertNumQueries(1):
+            page = self.client.get(reverse("documents-list"), {"include": "audio"}).data
+        audio = {row["id"]: row["audio"] for row in page["results"]}
+
+        self.assertEqual(audio[done.id]["status"], "done")
+        self.assertEqual(audio[done.id]["duration"], 3)
+        self.assertTrue(audio[done.id]["download_url"].endswith(f"/api/audio/{done.id}/download/"))
+        self.assertEqual(audio[running.id]["status"], "running")
+        self.assertEqual(audio[self.documents[2].id]["status"], "not_generated")
+
+    def test_audio_is_left_out_unless_asked_for(self):
+        page = self.client.get(reverse("documents-list")).data
+
+        self.assertNotIn("audio", page["results"][0])
+
+
+class FileDeletionTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="reader")
+
+    def upload(self, content=b"shared bytes"):
+        document = Document(user=self.user, title="Notes", file_type="pdf", file_size=0)
+        attach_upload(document, SimpleUploadedFile("notes.pdf", content))
+        return document
+
+    def test_shared_file_goes_with_its_last_document_after_purge(self):
+        first, second = self.upload(), self.upload()
+        name = first.file.name
+
+        first.delete()
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+        second.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(purge_pending_deletions(), 1)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_failed_deletion_is_retried_later(self):
+        PendingFileDeletion.schedule("documents/stuck.pdf")
+
+        with mock.patch.object(default_storage, "delete", side_effect=OSError("busy")):
+            purge_pending_deletions()
+
+        pending = PendingFileDeletion.objects.get()
+        self.assertEqual(pending.attempts, 1)
+        self.assertEqual(pending.last_error, "busy")
+
+    def test_sweeper_deletes_only_unreferenced_files(self):
+        kept = self.upload().file.name
+        orphan = default_storage.save("documents/blobs/zz/orphan.pdf", ContentFile(b"lost"))
+
+        call_command("sweep_orphan_files", "--delete", "--min-age", "0", stdout=io.StringIO())
+
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(default_storage.exists(orphan))
+
+
+def write_pdf(path, pages):
+    """
+    Minimal PDF with one line of Helvetica text per page.
+    """
+    count = len(pages)
+    font = 3 + 2 * count
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (3 + 2 * i) for i in range(count)), count
+        ),
+    ]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode()
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (4 + 2 * i, font)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class PdfExtractionTests(SimpleTestCase):
+    pages = [f"Page number {i}" for i in range(1, 6)]
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "notes.pdf")
+        write_pdf(self.path, self.pages)
+
+    @override_settings(PDF_EXTRACTION_PARALLEL_MIN_PAGES=100, PDF_EXTRACTION_PAGES_PER_TASK=2)
+    def test_small_pdf_is_extracted_in_process(self):
+        text, page_count = extract_text_from_pdf(self.path)
+
+        self.assertEqual(page_count, 5)
+        self.assertEqual(text, "\n\n".join(self.pages))
+
+    @override_settings(
+        PDF_EXTRACTION_PARALLEL_MIN_PAGES=2,
+        PDF_EXTRACTION_PAGES_PER_TASK=2,
+        PDF_EXTRACTION_PROCESSES=2,
+    )
+    def test_large_pdf_pages_stay_in_order_across_processes(self):
+        text, page_count = extract_text_from_pdf(self.path)
+
+        self.assertEqual(page_count, 5)
+        self.assertEqual(text, "\n\n".join(self.pages))
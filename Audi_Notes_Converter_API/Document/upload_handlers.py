@@ -0,0 +1,39 @@
+"""
+Upload handlers that hash files while the request body streams in, so
+the content hash is known without reading the stored file back.
+The hash is exposed as `uploaded_file.sha256`.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class HashingMixin:
+    def new_file(self, *args, **kwargs):
+        #before super(): the memory handler ends new_file() by raising StopFutureHandlers
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        #only hash data this handler keeps, not data handed to the next one
+        if passed_on is None:
+            self.digest.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.digest.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,240 @@
+"""
+Resumable uploads. A file is sent as a sequence of chunks, each streamed
+to its own storage object and verified against the client's sha256, then
+joined into a normal Document when the upload is finalized.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import attach_blob, store_blob
+from .models import Document, PendingFileDeletion, UploadSession
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """
+    Raised when a chunk or a finalize call is rejected
+    """
+    status_code = 400
+
+
+class UploadGone(UploadError):
+    #the session expired or was already finalized
+    status_code = 410
+
+
+# Readers
+class HashingReader:
+    """
+    File-like wrapper over a request stream that hashes what is read and
+    refuses to read more than `limit` bytes.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit + 1 - self.size
+        #one byte past the limit is enough to detect an oversized chunk
+        data = self.stream.read(min(size, self.limit + 1 - self.size)) if self.stream else b""
+        self.size += len(data)
+        if self.size > self.limit:
+            raise UploadError(f"Chunk exceeds {self.limit} bytes")
+        self.digest.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+class ChunkSequenceReader:
+    #reads stored chunks back to back, one chunk file open at a time
+    def __init__(self, storage, names):
+        self.storage = storage
+        self.names = list(names)
+        self.current = None
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = BLOCK_SIZE
+        while True:
+            if self.current is None:
+                if not self.names:
+                    return b""
+                self.current = self.storage.open(self.names.pop(0), "rb")
+            data = self.current.read(size)
+            if data:
+                self.digest.update(data)
+                return data
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+# Sessions
+def start_session(user, title, filename, total_size, description=""):
+    extension = os.path.splitext(filename)[1].lower().replace('.', '')
+    return UploadSession.objects.create(
+        user=user,
+        title=title,
+        description=description,
+        filename=os.path.basename(filename),
+        file_type=extension,
+        total_size=total_size,
+        chunk_size=settings.DOCUMENT_UPLOAD_CHUNK_SIZE,
+        expires_at=timezone.now() + timedelta(seconds=settings.DOCUMENT_UPLOAD_SESSION_TTL),
+    )
+
+def _check_open(session):
+    if session.status != UploadSession.STATUS_UPLOADING:
+        raise UploadGone("Upload already finalized")
+    if session.is_expired:
+        raise UploadGone("Upload session expired")
+
+def store_chunk(session, index, stream, checksum):
+    """
+    Stream one chunk to storage and append it to the session. Chunks must
+    arrive in order; resending an already stored chunk with the same
+    checksum succeeds without writing anything, so clients can retry
+    after a lost response.
+    """
+    _check_open(session)
+    checksum = (checksum or "").strip().lower()
+    if not checksum:
+        raise UploadError("X-Chunk-SHA256 header is required")
+
+    if index < session.next_chunk:
+        if session.chunks[index]['sha256'] == checksum:
+            return session
+        raise UploadError(f"Chunk {index} was already stored with a different checksum")
+    if index > session.next_chunk:
+        raise UploadError(f"Expected chunk {session.next_chunk}, got {index}")
+
+    remaining = session.total_size - session.received_bytes
+    reader = HashingReader(stream, min(session.chunk_size, remaining))
+    #the name is unique per write, so a concurrent retry never overwrites it
+    name = default_storage.get_available_name(session.chunk_name(index))
+    try:
+        name = default_storage.save(name, File(reader))
+    except UploadError:
+        default_storage.delete(name)
+        raise
+
+    chunk = {'name': name, 'size': reader.size, 'sha256': reader.hexdigest()}
+    if chunk['sha256'] != checksum:
+        default_storage.delete(name)
+        raise UploadError(f"Checksum mismatch for chunk {index}")
+    if chunk['size'] == 0:
+        default_storage.delete(name)
+        raise UploadError("Empty chunk")
+    if chunk['size'] < session.chunk_size and chunk['size'] < remaining:
+        #only the last chunk may be short, otherwise offsets drift
+        default_storage.delete(name)
+        raise UploadError(f"Chunk {index} is shorter than {session.chunk_size} bytes")
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        try:
+            _check_open(session)
+            if session.next_chunk != index:
+                raise UploadError(f"Chunk {index} was stored by another request")
+        except UploadError:
+            default_storage.delete(name)
+            raise
+        session.chunks = session.chunks + [chunk]
+        session.save(update_fields=['chunks'])
+
+    return session
+
+def chunks_sha256(session):
+    #one pass over the stored chunks, nothing is written
+    reader = ChunkSequenceReader(default_storage, [c['name'] for c in session.chunks])
+    try:
+        while reader.read(BLOCK_SIZE):
+            pass
+    finally:
+        reader.close()
+    return reader.digest.hexdigest()
+
+def finalize_session(session, checksum=None):
+    """
+    Join the stored chunks into a new Document and drop the chunks.
+    `checksum`, when given, is the sha256 of the whole file. Content that
+    is already stored is not written again.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        _check_open(session)
+        if session.received_bytes != session.total_size:
+            raise UploadError(
+                f"Upload incomplete: {session.received_bytes} of {session.total_size} bytes received"
+            )
+
+        sha256 = chunks_sha256(session)
+        if checksum and sha256 != checksum.strip().lower():
+            raise UploadError("Checksum mismatch for the assembled file")
+
+        document = Document.objects.create(
+            user=session.user,
+            title=session.title,
+            description=session.description,
+            file_type=session.file_type,
+            file_size=session.total_size,
+        )
+        for _ in range(2):
+            reader = ChunkSequenceReader(default_storage, [c['name'] for c in session.chunks])
+            try:
+                blob = store_blob(sha256, File(reader), session.total_size, session.filename)
+            finally:
+                reader.close()
+            if attach_blob(document, blob, session.filename):
+                break
+        else:
+            raise RuntimeError(f"Document blob {sha256} was released while attaching")
+
+        session.status = UploadSession.STATUS_COMPLETED
+        session.document = document
+        session.save(update_fields=['status', 'document'])
+        delete_chunks(session)
+
+    return document
+
+def delete_chunks(session):
+    #removed by the workers once the caller's transaction commits
+    PendingFileDeletion.schedule(*[chunk['name'] for chunk in session.chunks])
+
+def abort_session(session):
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == UploadSession.STATUS_UPLOADING:
+            delete_chunks(session)
+        session.delete()
+
+def purge_expired_sessions():
+    #drop sessions past their expiry, finished ones have no chunks left
+    expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+    count = 0
+    for session in expired.iterator():
+        with transaction.atomic():
+            if session.status == UploadSession.STATUS_UPLOADING:
+                delete_chunks(session)
+            session.delete()
+        count += 1
+    return count
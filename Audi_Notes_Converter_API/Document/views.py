@@ -1,17 +1,31 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.http import FileResponse, Http404
-import os
+from django.db.models import OuterRef, Subquery
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 
-from .models import Document
+from .models import Document, UploadSession
+from .extraction import schedule_extraction
+from .downloads import file_response
+from .uploads import (
+    UploadError,
+    abort_session,
+    finalize_session,
+    start_session,
+    store_chunk,
+)
 from .serializers import (
     DocumentSerializer,
     DocumentUpdateSerializer,
-    DocumentUploadSerializer
+    DocumentUploadSerializer,
+    UploadFinalizeSerializer,
+    UploadSessionSerializer,
 )
 
 from ActivityLog.utils import log_activity
+from Audio.models import AudioGenerationJob
+from Audi_Notes_Converter_API.pagination import KeysetPagination
 
 # Custom permission
 class IsOwner(permissions.BasePermission):
@@ -32,17 +46,49 @@ class IsOwner(permissions.BasePermission):
 
 class DocumentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    # Cursor pages on (uploaded_at, id), served by the (user, -uploaded_at, -id) index
+    pagination_class = KeysetPagination
+    ordering = ('-uploaded_at', '-id')
 
     def get_queryset(self):
         # Prevent swagger crash
         if getattr(self, 'swagger_fake_view', False):
             return Document.objects.none()
 
-        return Document.objects.filter(user=self.request.user)
+        queryset = Document.objects.filter(user=self.request.user)
+
+        if self.includes_audio():
+            # Audio row joined in, latest job status as a correlated subquery
+            latest_job = (
+                AudioGenerationJob.objects
+                .filter(document=OuterRef('pk'))
+                .order_by('-created_at')
+                .values('status')[:1]
+            )
+            queryset = queryset.select_related('audio').annotate(
+                latest_audio_job_status=Subquery(latest_job)
+            )
+
+        return queryset
+
+    def includes_audio(self):
+        if self.action not in ['list', 'retrieve']:
+            return False
+        include = self.request.query_params.get('include', '')
+        return 'audio' in include.split(',')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_audio'] = self.includes_audio()
+        return context
 
     def get_serializer_class(self):
         if self.action == 'create':
             return DocumentUploadSerializer
+        elif self.action in ['start_upload', 'upload_status', 'upload_chunk']:
+            return UploadSessionSerializer
+        elif self.action == 'finalize_upload':
+            return UploadFinalizeSerializer
         elif self.action in ['update', 'partial_update']:
             return DocumentUpdateSerializer
         return DocumentSerializer
@@ -50,6 +96,9 @@ class DocumentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         document = serializer.save(user=self.request.user)
 
+        # Text is extracted once, in the background
+        schedule_extraction(document)
+
         log_activity(
             request=self.request,
             user=self.request.user,
@@ -61,6 +110,10 @@ class DocumentViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         document = serializer.save()
 
+        # A replaced file invalidates the extracted text
+        if 'file' in serializer.validated_data:
+            schedule_extraction(document)
+
         log_activity(
             request=self.request,
             user=self.request.user,
@@ -96,17 +149,16 @@ class DocumentViewSet(viewsets.ModelViewSet):
             )
             raise Http404("File not found")
 
-        file_path = document.file.path
-
-        if not os.path.exists(file_path):
+        # Through the storage API, not a local path: works with any storage backend
+        if not document.file.storage.exists(document.file.name):
             log_activity(
                 request=request,
                 user=request.user,
                 action="DOCUMENT_DOWNLOAD",
-                details=f"Download failed: file missing on disk (ID {document.id})",
+                details=f"Download failed: file missing from storage (ID {document.id})",
                 status="failed",
             )
-            raise Http404("File not found on disk")
+            raise Http404("File not found in storage")
 
         log_activity(
             request=request,
@@ -116,8 +168,107 @@ class DocumentViewSet(viewsets.ModelViewSet):
             status="success",
         )
 
-        return FileResponse(
-            open(file_path, 'rb'),
-            as_attachment=True,
-            filename=os.path.basename(file_path),
-        )
\ No newline at end of file
+        # Supports Range requests, ETag and Last-Modified validators
+        return file_response(
+            request,
+            document.file,
+            filename=document.download_name,
+        )
+
+    # RESUMABLE UPLOADS
+    # init -> PUT every chunk in order with an X-Chunk-SHA256 header -> finalize
+    def get_upload_session(self, upload_id):
+        return get_object_or_404(UploadSession, id=upload_id, user=self.request.user)
+
+    def upload_error_response(self, error):
+        return Response({"detail": str(error)}, status=error.status_code)
+
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def start_upload(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        session = start_session(
+            user=request.user,
+            title=serializer.validated_data['title'],
+            description=serializer.validated_data.get('description', ''),
+            filename=serializer.validated_data['filename'],
+            total_size=serializer.validated_data['total_size'],
+        )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=False,
+        methods=['get', 'delete'],
+        url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})',
+    )
+    def upload_status(self, request, upload_id=None):
+        session = self.get_upload_session(upload_id)
+
+        if request.method == 'DELETE':
+            abort_session(session)
+            log_activity(
+                request=request,
+                user=request.user,
+                action="DOCUMENT_UPLOAD_ABORT",
+                details=f"Resumable upload aborted ({upload_id})",
+                status="success",
+            )
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        return Response(UploadSessionSerializer(session).data)
+
+    @action(
+        detail=False,
+        methods=['put'],
+        url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})/chunks/(?P<index>[0-9]+)',
+    )
+    def upload_chunk(self, request, upload_id=None, index=None):
+        session = self.get_upload_session(upload_id)
+
+        # Raw body, read straight from the socket into storage
+        try:
+            session = store_chunk(
+                session,
+                int(index),
+                request.stream,
+                request.headers.get('X-Chunk-SHA256'),
+            )
+        except UploadError as e:
+            return self.upload_error_response(e)
+
+        return Response(UploadSessionSerializer(session).data)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})/finalize',
+    )
+    def finalize_upload(self, request, upload_id=None):
+        session = self.get_upload_session(upload_id)
+        serializer = UploadFinalizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            document = finalize_session(session, serializer.validated_data.get('sha256'))
+        except UploadError as e:
+            log_activity(
+                request=request,
+                user=request.user,
+                action="DOCUMENT_UPLOAD",
+                details=f"Resumable upload failed ({upload_id}): {e}",
+                status="failed",
+            )
+            return self.upload_error_response(e)
+
+        # Text is extracted once, in the background
+        schedule_extraction(document)
+
+        log_activity(
+            request=request,
+            user=request.user,
+            action="DOCUMENT_UPLOAD",
+            details=f"Document uploaded (ID {document.id}, resumable)",
+            status="success",
+        )
+        return Response(DocumentSerializer(document).data, status=status.HTTP_201_CREATED)